@@ -1,12 +1,11 @@
 #pip install cloudinary
 
 # Video Upload to Cloudinary 
-import cloudinary
-import cloudinary.uploader
 
 class CloudUploader:
     def __init__(self):
-        # Step 1: Configure Cloudinary
+        # Step 1: Configure Cloudinary (imported here to keep module import cheap)
+        import cloudinary
         cloudinary.config(
             cloud_name="ddm6kadfn",  
             api_key="",  
@@ -15,6 +14,8 @@ class CloudUploader:
 
     # Step 2: Function to Upload Video to Cloudinary
     def upload_to_cloudinary(self, local_video_path):
+        import cloudinary.uploader
+
         print("Uploading video to Cloudinary...")
         try:
             response = cloudinary.uploader.upload(
@@ -1,14 +1,23 @@
 #!pip install edge-tts
 #!pip install asyncio
 
-import edge_tts
-import nest_asyncio
 import asyncio
 import os
-from typing import List
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import List, Optional
+
+from artifactcache import ArtifactCache
+from asyncutils import run_coroutine
+from mediautils import cut_audio
+
+# Edge TTS reports word offsets and durations in 100 ns ticks
+TICKS_PER_SECOND = 10_000_000
 
 class TextToSpeechTransformer:
-    def __init__(self, voice="en-US-AriaNeural", rate="+0%", pitch="+0Hz"):
+    def __init__(self, voice="en-US-AriaNeural", rate="+0%", pitch="+0Hz", max_concurrency=4,
+                 retries=3, backoff=1.0, cache: Optional[ArtifactCache] = None):
         """
         Initializes the text-to-speech transformer with default or custom voice, rate, and pitch.
         Also applies the nest_asyncio fix to avoid conflicts with existing event loops.
@@ -16,11 +25,23 @@ class TextToSpeechTransformer:
         :param voice: The voice to use (e.g., 'en-US-AriaNeural').
         :param rate: The speech rate (e.g., '+0%', '-10%', etc.).
         :param pitch: The speech pitch (e.g., '+0Hz', '+5Hz', etc.).
+        :param max_concurrency: Maximum number of synthesis requests in flight at once, across all
+                                threads sharing this transformer.
+        :param retries: Number of retries for a failed synthesis request.
+        :param backoff: Delay in seconds before the first retry, doubled for every further retry.
+        :param cache: Optional ArtifactCache; audio for the same text, voice, rate and pitch is reused.
         """
         self.voice = voice
         self.rate = rate
         self.pitch = pitch
+        self.max_concurrency = max_concurrency
+        # Every video thread runs its own event loop, so the limit is a thread-level semaphore
+        self._slots = threading.BoundedSemaphore(max(1, max_concurrency))
+        self.retries = retries
+        self.backoff = backoff
+        self.cache = cache
         # Apply the fix for Colab's already running event loop
+        import nest_asyncio
         nest_asyncio.apply()
         # Create voiceovers directory if it doesn't exist
         os.makedirs("voiceovers", exist_ok=True)
@@ -36,15 +57,159 @@ class TextToSpeechTransformer:
         if not script.strip():
             raise ValueError("The script text cannot be empty!")
 
-        communicate = edge_tts.Communicate(
-            text=script,
-            voice=self.voice,
-            rate=self.rate,
-            pitch=self.pitch
-        )
+        communicate = self._communicate(script)
         await communicate.save(output_audio_path)
         print(f"Voiceover saved to: {output_audio_path}")
 
+    def _communicate(self, script, word_boundaries=False):
+        """
+        Create the Edge TTS request for `script` with this transformer's voice settings.
+        """
+        import edge_tts
+
+        kwargs = dict(text=script, voice=self.voice, rate=self.rate, pitch=self.pitch)
+        if word_boundaries:
+            try:
+                return edge_tts.Communicate(boundary="WordBoundary", **kwargs)
+            except TypeError:
+                # Older edge-tts versions always emit word boundaries
+                pass
+        return edge_tts.Communicate(**kwargs)
+
+    @asynccontextmanager
+    async def _slot(self, poll_interval=0.02):
+        """
+        Hold one of the `max_concurrency` request slots shared by all threads.
+        Polls instead of blocking, so the event loop keeps serving the requests in flight.
+        """
+        while not self._slots.acquire(blocking=False):
+            await asyncio.sleep(poll_interval)
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+    async def _with_retry(self, make_request, description):
+        """
+        Run `make_request()` under the concurrency limit, retrying with exponential backoff.
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._slot():
+                    return await make_request()
+            except ValueError:
+                raise
+            except Exception as e:
+                if attempt == self.retries:
+                    raise RuntimeError(f"Voiceover failed for {description}: {e}") from e
+                delay = self.backoff * (2 ** attempt)
+                print(f"Voiceover attempt {attempt + 1} failed for {description} ({e}), retrying in {delay:.1f}s...")
+                await asyncio.sleep(delay)
+
+    def _cache_key(self, script):
+        return ArtifactCache.make_key(
+            "voiceover", sentence=script, voice=self.voice, rate=self.rate, pitch=self.pitch
+        )
+
+    def _cached_voiceover(self, script):
+        if self.cache is None:
+            return None
+        return self.cache.get_file("voiceover", self._cache_key(script))
+
+    def _store_voiceover(self, script, path):
+        if self.cache is None:
+            return path
+        return self.cache.put_file("voiceover", self._cache_key(script), path)
+
+    async def _synthesize_with_boundaries(self, script, output_audio_path):
+        """
+        Synthesize `script` in one request and return its word boundaries as
+        (start_seconds, end_seconds, word) tuples.
+        """
+        audio = bytearray()
+        boundaries = []
+
+        async for chunk in self._communicate(script, word_boundaries=True).stream():
+            if chunk["type"] == "audio":
+                audio.extend(chunk["data"])
+            elif chunk["type"] == "WordBoundary":
+                start = chunk["offset"] / TICKS_PER_SECOND
+                boundaries.append((start, start + chunk["duration"] / TICKS_PER_SECOND, chunk["text"]))
+
+        if not audio:
+            raise RuntimeError("No audio was received")
+
+        with open(output_audio_path, "wb") as f:
+            f.write(audio)
+        return boundaries
+
+    def _split_points(self, sentences, boundaries):
+        """
+        Find where each sentence starts and ends in the audio of the joined script.
+
+        Every word boundary is located in the joined text to find the sentence it
+        belongs to; the cut between two sentences is placed in the middle of the
+        pause between them.
+
+        :return: List of (start, end) seconds per sentence, end None for the last one,
+                 or None if some sentence has no word boundaries
+        """
+        text = " ".join(sentences)
+        sentence_ends = []
+        position = 0
+        for sentence in sentences:
+            position += len(sentence)
+            sentence_ends.append(position)
+            position += 1
+
+        first_word = [None] * len(sentences)
+        last_word = [None] * len(sentences)
+        cursor = 0
+        index = 0
+        for start, end, word in boundaries:
+            found = text.find(word, cursor)
+            if found < 0:
+                continue
+            cursor = found + len(word)
+            while index < len(sentences) - 1 and found >= sentence_ends[index]:
+                index += 1
+            if first_word[index] is None:
+                first_word[index] = start
+            last_word[index] = end
+
+        if any(t is None for t in first_word):
+            return None
+
+        cuts = [0.0]
+        for i in range(len(sentences) - 1):
+            cuts.append((last_word[i] + first_word[i + 1]) / 2)
+        return [(cuts[i], cuts[i + 1] if i + 1 < len(cuts) else None) for i in range(len(sentences))]
+
+    async def _generate_single_request(self, scripts, base_output_path):
+        """
+        Synthesize all scripts in one request and cut the audio at the sentence boundaries.
+        Falls back to one request per script if the boundaries cannot be matched.
+        """
+        full_audio_path = os.path.join("voiceovers", f"{base_output_path}_full.mp3")
+        boundaries = await self._with_retry(
+            lambda: self._synthesize_with_boundaries(" ".join(scripts), full_audio_path),
+            "the full script",
+        )
+
+        spans = self._split_points(scripts, boundaries)
+        if spans is None:
+            print("Could not match word boundaries to sentences, synthesizing per sentence")
+            os.remove(full_audio_path)
+            return None
+
+        output_paths = []
+        for i, (start, end) in enumerate(spans):
+            output_path = os.path.join("voiceovers", f"{base_output_path}_{i}.wav")
+            cut_audio(full_audio_path, output_path, start, end)
+            output_paths.append(output_path)
+        os.remove(full_audio_path)
+        return output_paths
+
     def generate_voiceover(self, script: str, output_audio_path: str) -> str:
         """
         Public method to generate a voiceover. Internally calls the asynchronous method.
@@ -54,44 +219,70 @@ class TextToSpeechTransformer:
         :return: Path to the generated audio file
         """
         output_path = os.path.join("voiceovers", output_audio_path)
-        loop = asyncio.get_event_loop()
-        loop.run_until_complete(self._generate_voiceover_edge_tts(script, output_path))
+        run_coroutine(self._generate_voiceover_edge_tts(script, output_path))
         return output_path
 
-    async def _generate_multiple_voiceovers(self, scripts: List[str], base_output_path: str) -> List[str]:
+    async def _generate_multiple_voiceovers(self, scripts: List[str], base_output_path: str,
+                                            single_request: bool = False, on_voiceover=None) -> List[str]:
         """
         Asynchronous method to generate multiple voiceovers from a list of scripts.
+        Scripts found in the cache are not synthesized again; the rest run with at most
+        `max_concurrency` requests in flight, or as one request if `single_request` is set.
         
         :param scripts: List of text scripts to be converted to speech
         :param base_output_path: Base path for output audio files
+        :param single_request: Synthesize all missing scripts in one request and split the audio
+        :param on_voiceover: Optional callback(index, start, seconds) for every script synthesized in its own request
         :return: List of paths to generated audio files in same order as input scripts
         """
-        output_paths = []
-        tasks = []
-        
-        for i, script in enumerate(scripts):
-            output_path = os.path.join("voiceovers", f"{base_output_path}_{i}.wav")
-            output_paths.append(output_path)
-            task = self._generate_voiceover_edge_tts(script, output_path)
-            tasks.append(task)
-            
-        await asyncio.gather(*tasks)
+        output_paths = [self._cached_voiceover(script) for script in scripts]
+        missing = [i for i, path in enumerate(output_paths) if path is None]
+        if len(missing) < len(scripts):
+            print(f"Voiceover cache hit for {len(scripts) - len(missing)} of {len(scripts)} sentences")
+        if not missing:
+            return output_paths
+
+        generated = None
+        if single_request and len(missing) > 1:
+            generated = await self._generate_single_request([scripts[i] for i in missing], base_output_path)
+
+        if generated is None:
+            async def synthesize(i, path):
+                # Timed inside the request slot, so waiting for a free slot is not counted
+                start = time.perf_counter()
+                await self._generate_voiceover_edge_tts(scripts[i], path)
+                if on_voiceover is not None:
+                    on_voiceover(i, start, time.perf_counter() - start)
+
+            generated = [os.path.join("voiceovers", f"{base_output_path}_{i}.wav") for i in missing]
+            await asyncio.gather(*(
+                self._with_retry(lambda i=i, path=path: synthesize(i, path), f"sentence {i}")
+                for i, path in zip(missing, generated)
+            ))
+
+        for i, path in zip(missing, generated):
+            output_paths[i] = self._store_voiceover(scripts[i], path)
         return output_paths
 
-    def generate_multiple_voiceovers(self, sentences: List[str], base_output_path: str = "audio") -> List[str]:
+    def generate_multiple_voiceovers(self, sentences: List[str], base_output_path: str = "audio",
+                                     single_request: bool = False, on_voiceover=None) -> List[str]:
         """
         Public method to generate multiple voiceovers from a list of sentences.
         
         :param sentences: List of sentences to convert to speech
         :param base_output_path: Base name for the output audio files
+        :param single_request: Synthesize the whole script in one request and split it by word boundaries
+        :param on_voiceover: Optional callback(index, start, seconds) for every sentence synthesized in its own request,
+            with `start` taken from time.perf_counter()
         :return: List of paths to generated audio files in same order as input sentences
         :raises ValueError: If the sentences list is empty
         """
         if not sentences:
             raise ValueError("The list of sentences cannot be empty")
             
-        loop = asyncio.get_event_loop()
-        return loop.run_until_complete(self._generate_multiple_voiceovers(sentences, base_output_path))
+        return run_coroutine(
+            self._generate_multiple_voiceovers(sentences, base_output_path, single_request, on_voiceover)
+        )
 
 
 # Example usage
@@ -7,6 +7,9 @@ def main():
     # User inputs a YouTube link
     video_url = st.text_input("Enter the YouTube video URL:")
 
+    # Drafts render fast at low resolution and are not published
+    draft = st.checkbox("Draft preview (low resolution, not published)")
+
     # Trigger Reel creation
     if st.button("Reelize"):
         if not video_url:
@@ -14,9 +17,31 @@ def main():
         else:
             try:
                 engine = appworkflow.Engine(video_url)
-                engine.process_video()
-                st.success(f"Video was processed successfully!")
-                    
+                if not engine.process_video(draft=draft):
+                    st.error("Video processing failed, see the logs for details.")
+                elif draft:
+                    # Keep the engine so the draft can be promoted on a later rerun
+                    st.session_state["draft_engine"] = engine
+                else:
+                    st.session_state.pop("draft_engine", None)
+                    st.success(f"Video was processed successfully!")
+
+            except Exception as e:
+                st.error(f"An error occurred: {e}")
+
+    # Show the last draft and offer to render it in full quality
+    engine = st.session_state.get("draft_engine")
+    if engine is not None and engine.draft_path:
+        st.subheader("Draft preview")
+        st.video(engine.draft_path)
+
+        if st.button("Promote to full quality"):
+            try:
+                if engine.promote():
+                    st.session_state.pop("draft_engine", None)
+                    st.success(f"Full-quality video was processed successfully!")
+                else:
+                    st.error("Rendering the full-quality video failed, see the logs for details.")
             except Exception as e:
                 st.error(f"An error occurred: {e}")
 
@@ -1,24 +1,102 @@
-from llamarizer import LLaMarizer
+import os
+import shutil
+import threading
+import time
+
+from contextlib import nullcontext
+
 from imagescraper import ImageScraper
-from ytdownloader import process_youtube_link
+from imagecache import ImageCache
+from imagenormalizer import ImageNormalizer
+from ytdownloader import (
+    download_youtube_audio, transcribe_audio, extract_video_id, fetch_youtube_captions, stream_transcript,
+)
 from TextToSpeechTransformer import TextToSpeechTransformer
 from moviecutter import MovieCutter
 from Cloud_Uploader import CloudUploader
 from reelPublisher import ReelPublisher
+from modelregistry import registry
+from artifactcache import ArtifactCache, hash_text, hash_file
+from stagescheduler import StageScheduler
+from instrumentation import Tracer
+
+# Items allowed to run at once per stage, unless overridden through Engine(stage_concurrency=...)
+# ("voiceovers" is passed to the TTS client as the number of requests in flight, shared by
+# all engines using that client)
+DEFAULT_STAGE_CONCURRENCY = {"search_terms": 1, "images": 2, "voiceovers": 4}
+
+# Whole stages bounded by the scheduler's concurrency limits. With a scheduler shared
+# by several engines this caps e.g. concurrent Whisper runs or renders across all of them.
+LIMITED_STAGES = ("transcript", "script", "video")
+
+# Sampling parameters of the LLM stages, part of their cache keys
+SCRIPT_GENERATION = {"model": "meta-llama/Llama-3.2-1B-Instruct", "max_new_tokens": 512, "do_sample": True}
 
 class Engine:
-    def __init__(self, video_url: str, output_path: str = "downloads"):
+    def __init__(self, video_url: str, output_path: str = "downloads", whisper_model: str = "base",
+                 cache: ArtifactCache = None, use_cache: bool = True,
+                 stage_concurrency: dict = None, search_term_batch_size: int = 8,
+                 image_backend: str = "selenium", tts_single_request: bool = False,
+                 renderer: str = "ffmpeg", reel_size: tuple = (1080, 1920), image_fit: str = "letterbox",
+                 use_captions: bool = True, caption_languages: tuple = ("en",), whisper_workers: int = None,
+                 stream_transcription: bool = False, progress_callback=None,
+                 scraper: ImageScraper = None, transformer: TextToSpeechTransformer = None,
+                 normalizer: ImageNormalizer = None, scheduler: StageScheduler = None,
+                 tracer: Tracer = None, trace_dir: str = None, profile_stages: tuple = ()):
         self.video_url = video_url
         self.output_path = output_path
-        self.llamarizer = LLaMarizer(use_cuda=False)
-        self.scraper = ImageScraper(save_folder="images")
+        self.whisper_model = whisper_model
+        # Whisper worker processes for chunked transcription, None for one per CPU core. The pool is
+        # started once per process and shared by all engines; 1 transcribes with the registry's model
+        self.whisper_workers = whisper_workers
+        # Transcribe the audio stream while it downloads instead of downloading it first
+        self.stream_transcription = stream_transcription
+        # Called as progress_callback(stage, state, fraction) when a stage starts or finishes
+        self.progress_callback = progress_callback
+        self._progress_lock = threading.Lock()
+        self.completed_stages = []
+        self.stage_times = {}
+        self.error = None
+        # Existing YouTube captions replace the Whisper stage when they pass the quality check
+        self.use_captions = use_captions
+        self.caption_languages = tuple(caption_languages)
+        self.stage_concurrency = {**DEFAULT_STAGE_CONCURRENCY, **(stage_concurrency or {})}
+        # Scraper, TTS client, normalizer and scheduler can be shared by several engines,
+        # e.g. in batch runs; shared instances are closed by their owner, not by the engine
+        self.owns_scraper = scraper is None
+        self.owns_normalizer = normalizer is None
+        # One pooled browser per concurrent image download
+        self.scraper = scraper or ImageScraper(
+            save_folder="images",
+            pool_size=self.stage_concurrency["images"],
+            backend=image_backend,
+            cache=ImageCache() if use_cache else None,
+        )
+        self.scheduler = scheduler
         self.cloudUploader = CloudUploader()
-        self.transformer = TextToSpeechTransformer()
-        self.transcription_file = None
+        self.cache = (cache or ArtifactCache()) if use_cache else None
+        self.transformer = transformer or TextToSpeechTransformer(
+            cache=self.cache, max_concurrency=self.stage_concurrency["voiceovers"]
+        )
+        self.tts_single_request = tts_single_request
+        self.renderer = renderer
+        self.reel_size = tuple(reel_size)
+        self.normalizer = normalizer or ImageNormalizer(size=self.reel_size, mode=image_fit, cache=self.cache)
+        self.video_id = extract_video_id(video_url)
+        # Wall time, CPU time, peak RSS and item counts per stage and per item;
+        # written to `trace_dir` after every run if set. Stages in `profile_stages` are cProfiled.
+        self.tracer = tracer or Tracer(name=self.video_id, profile_stages=profile_stages)
+        self.trace_dir = trace_dir
+        self.search_term_batch_size = search_term_batch_size
+        self.transcript = None
+        self.transcript_source = None
         self.script_text = None
         self.processed_script = None
         self.bing_terms = None
         self.image_paths = None
+        self.frame_paths = None
+        self.video_path = None
+        self.draft_path = None
         self.voiceover_paths = None
         self.reelPublisher = ReelPublisher(
             access_token="",
@@ -26,50 +104,314 @@ class Engine:
             caption="Reelwise AI generated Educational Summary"
             )
 
-    def process_video(self):
+    @property
+    def llamarizer(self):
+        # Loaded on the first LLM cache miss and shared per process through the registry
+        return registry.get_llamarizer(use_cuda=False)
+
+    def _stage(self, name, func, total, limit=None):
+        """
+        Wrap a stage function so that its start and end are reported to `progress_callback`
+        and it is traced as a span, with its wall time kept in `stage_times`.
+
+        :param limit: Semaphore held while the stage runs, bounding it across engines sharing a scheduler
+        """
+        def run(*args, **kwargs):
+            with limit or nullcontext():
+                self._report_progress(name, "started", total)
+                with self.tracer.span(name) as span:
+                    result = func(*args, **kwargs)
+                    if isinstance(result, list):
+                        span.add_items(len(result))
+                self.stage_times[name] = span.wall_seconds
+                self._report_progress(name, "done", total)
+                return result
+        return run
+
+    def _traced(self, name, func, *args):
+        """Call `func(*args)` inside a span named `name`."""
+        with self.tracer.span(name):
+            return func(*args)
+
+    def export_trace(self):
+        """
+        Append the recorded spans to `trace_dir/traces.jsonl`, write a Chrome trace of
+        this run and start a fresh recording.
+
+        Export errors are printed rather than raised, so a full disk or an unwritable
+        trace directory never changes the outcome of the run being traced.
+
+        :return: Path of the Chrome trace file, or None if tracing output is disabled or failed
+        """
+        if self.trace_dir is None:
+            return None
         try:
-            # Download and transcribe video
-            self.transcription_file = process_youtube_link(self.video_url, self.output_path)
-            print(f"Transcription saved to: {self.transcription_file}")
-            
-            # Read transcription
-            with open(self.transcription_file, 'r', encoding='utf-8') as f:
-                transcript = f.read()
-
-            # Generate and process script
+            os.makedirs(self.trace_dir, exist_ok=True)
+            self.tracer.export_jsonl(os.path.join(self.trace_dir, "traces.jsonl"))
+            trace_path = self.tracer.export_chrome_trace(
+                os.path.join(self.trace_dir, f"{self.video_id}_{int(time.time())}.trace.json")
+            )
+        except Exception as e:
+            print(f"Could not write trace: {e}")
+            return None
+        finally:
+            self.tracer.reset()
+        print(f"Trace written to {trace_path}")
+        return trace_path
+
+    def _report_progress(self, stage, state, total):
+        # Stages run on scheduler threads, so progress updates are serialized
+        with self._progress_lock:
+            if state == "done":
+                self.completed_stages.append(stage)
+            if self.progress_callback is not None:
+                try:
+                    self.progress_callback(stage, state, len(self.completed_stages) / total)
+                except Exception as e:
+                    print(f"Progress callback failed: {e}")
+
+    def _cached_json(self, stage, params, compute):
+        """
+        Return the cached output of `stage` for `params`, or compute and store it.
+        """
+        if self.cache is None:
+            return compute()
+
+        key = self.cache.make_key(stage, **params)
+        value = self.cache.get_json(stage, key)
+        if value is not None:
+            print(f"Cache hit for {stage}")
+            return value
+
+        value = compute()
+        self.cache.put_json(stage, key, value)
+        return value
+
+    def _cached_files(self, stage, params_list, compute_missing):
+        """
+        Return one file path per entry of `params_list`, taking cached files where
+        possible. `compute_missing(indices)` must produce the paths for all misses,
+        in the order of `indices`.
+        """
+        if self.cache is None:
+            return compute_missing(list(range(len(params_list))))
+
+        keys = [self.cache.make_key(stage, **params) for params in params_list]
+        paths = [self.cache.get_file(stage, key) for key in keys]
+        missing = [i for i, path in enumerate(paths) if path is None]
+        if len(missing) < len(paths):
+            print(f"Cache hit for {len(paths) - len(missing)} of {len(paths)} {stage} items")
+
+        if missing:
+            computed = list(compute_missing(missing))
+            # Items are copied into the cache only after all of them are computed, so two
+            # items written to the same file would silently cache the last one for both
+            if len(set(computed)) < len(computed):
+                raise RuntimeError(f"{stage} items were written to the same file: {computed}")
+            for i, path in zip(missing, computed):
+                paths[i] = self.cache.put_file(stage, keys[i], path)
+        return paths
+
+    def _download_audio(self):
+        return self._cached_files(
+            "audio",
+            [{"video_id": self.video_id}],
+            lambda _: [self._traced("audio_download", download_youtube_audio, self.video_url, self.output_path)],
+        )[0]
+
+    def _transcribe(self):
+        def transcribe():
+            if self.use_captions:
+                text, source = self._traced("captions", fetch_youtube_captions, self.video_url, self.caption_languages)
+                if text is not None:
+                    return {"text": text, "source": source}
+            if self.stream_transcription:
+                segments = []
+                with self.tracer.span("whisper_stream") as span:
+                    for segment in stream_transcript(self.video_url, self.whisper_model):
+                        segments.append(segment)
+                        span.add_items()
+                        print(f"Transcribed segment {len(segments)}: {segment[:60]}...")
+                return {"text": " ".join(segments), "source": "whisper"}
+            audio_path = self._download_audio()
+            return {
+                "text": self._traced("whisper", transcribe_audio, audio_path, self.whisper_model, self.whisper_workers),
+                "source": "whisper",
+            }
+
+        result = self._cached_json(
+            "transcript",
+            {
+                "video_id": self.video_id,
+                "whisper_model": self.whisper_model,
+                "captions": list(self.caption_languages) if self.use_captions else None,
+            },
+            transcribe,
+        )
+        self.transcript = result["text"]
+        self.transcript_source = result["source"]
+        print(f"Transcription of {self.video_id} ready (source: {self.transcript_source})")
+        return self.transcript
+
+    def _generate_script(self, transcript):
+        # Only the prompt text is needed for the cache key; the model loads on a cache miss
+        from llamarizer import SCRIPT_SYSTEM_PROMPT
+
+        def generate():
             script_output = self.llamarizer.generate_script(transcript)
-            self.script_text = script_output[0]["generated_text"][-1]["content"]
-            print("Valid script generated:", self.script_text)
-            
-            # Split script into a list of sentences
-            self.processed_script = self.llamarizer.process_script(self.script_text)
-            print(self.processed_script)
-
-            # Generate search terms and download images
-            self.bing_terms = self.llamarizer.generate_multiple_bing_search_terms(self.processed_script)
-            print(self.bing_terms)
-            
-            self.image_paths = self.scraper.download_images_for_bing_prompts(self.bing_terms)
-            print(self.image_paths)
-
-            # Create voiceover for script sentences
-            self.voiceover_paths = self.transformer.generate_multiple_voiceovers(self.processed_script)
-            print(f"Generated audio files: {self.voiceover_paths}")
-
-            #Combine all components into one video
-            movie = MovieCutter(self.processed_script, self.voiceover_paths, self.image_paths)
-            video_path = movie.create_video()
-            print(f"Video created at: {video_path}")
-
-            #Upload the video to a webhosting service
+            return script_output[0]["generated_text"][-1]["content"]
+
+        self.script_text = self._cached_json(
+            "script",
+            {
+                "transcript": hash_text(transcript),
+                "prompt": hash_text(SCRIPT_SYSTEM_PROMPT),
+                **SCRIPT_GENERATION,
+            },
+            generate,
+        )
+        print("Valid script generated:", self.script_text)
+        return self.script_text
+
+    def _process_script(self, script):
+        from llamarizer import process_script
+
+        # Split script into a list of sentences
+        self.processed_script = process_script(script)
+        print(self.processed_script)
+        return self.processed_script
+
+    def _generate_search_terms(self, sentences, on_term=None):
+        """
+        Return one search term per sentence. `on_term(index, term)` is called as
+        soon as each term is known, so downstream work can start per sentence.
+        """
+        from llamarizer import SEARCH_TERM_SYSTEM_PROMPT
+
+        prompt = hash_text(SEARCH_TERM_SYSTEM_PROMPT)
+        terms = [None] * len(sentences)
+        keys = []
+
+        if self.cache is not None:
+            keys = [
+                self.cache.make_key("search_term", sentence=sentence, prompt=prompt, **SCRIPT_GENERATION)
+                for sentence in sentences
+            ]
+            terms = [self.cache.get_json("search_term", key) for key in keys]
+
+        missing = [i for i, term in enumerate(terms) if term is None]
+        if on_term is not None:
+            for i, term in enumerate(terms):
+                if term is not None:
+                    on_term(i, term)
+
+        batch_size = max(1, self.search_term_batch_size)
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start:start + batch_size]
+            with self.tracer.span("search_term_batch", items=len(batch)):
+                generated = self.llamarizer.generate_multiple_bing_search_terms(
+                    [sentences[i] for i in batch], batch_size=batch_size
+                )
+            for i, term in zip(batch, generated):
+                terms[i] = term
+                if self.cache is not None:
+                    self.cache.put_json("search_term", keys[i], term)
+                if on_term is not None:
+                    on_term(i, term)
+        return terms
+
+    def _download_image(self, index, search_term):
+        # Repeated search terms are served from the scraper's image cache
+        with self.tracer.span("image", items=1, stage="images", index=index):
+            downloaded = self.scraper.download_images_for_bing_prompts(
+                [search_term], prefix=f"{self.video_id}_{index}_"
+            )
+        if not downloaded:
+            raise RuntimeError(f"No image found for search term: {search_term}")
+        return downloaded[0]
+
+    def _search_terms_and_images(self, scheduler, sentences):
+        """
+        Generate search terms and download each sentence's image as soon as its
+        term is ready, with at most `stage_concurrency["images"]` downloads at once.
+        """
+        image_futures = {}
+
+        def on_term(i, term):
+            image_futures[i] = scheduler.submit("images", self._download_image, i, term)
+
+        with scheduler.limit("search_terms"):
+            self.bing_terms = self._generate_search_terms(sentences, on_term)
+        print(self.bing_terms)
+
+        self.image_paths = [image_futures[i].result() for i in range(len(sentences))]
+        print(self.image_paths)
+        return self.image_paths
+
+    def _generate_voiceovers(self, sentences):
+        # The requests run concurrently on one event loop, so each sentence is
+        # recorded with its wall time only, as a child of the voiceovers span
+        def on_voiceover(index, start, seconds):
+            self.tracer.record("voiceover", start, seconds, items=1, stage="voiceovers", index=index)
+
+        # Sentences rendered before with the same voice settings come from the cache
+        self.voiceover_paths = self.transformer.generate_multiple_voiceovers(
+            sentences, base_output_path=self.video_id, single_request=self.tts_single_request,
+            on_voiceover=on_voiceover,
+        )
+        print(f"Generated audio files: {self.voiceover_paths}")
+        return self.voiceover_paths
+
+    def _normalize_images(self, images):
+        # Bring every image to the reel resolution once, before rendering
+        self.frame_paths = self.normalizer.normalize(images)
+        return self.frame_paths
+
+    def _render(self, sentences, voiceovers, frames, quality="full"):
+        #Combine all components into one video
+        def render(_):
+            with MovieCutter(
+                sentences, voiceovers, frames, renderer=self.renderer, size=self.reel_size, cache=self.cache
+            ) as movie:
+                output_filename = os.path.join(self.output_path, f"{self.video_id}_{quality}.mp4")
+                return [movie.create_video(output_filename, quality=quality)]
+
+        params = {
+            "renderer": self.renderer,
+            "size": list(self.reel_size),
+            "quality": quality,
+            "sentences": sentences,
+            "audio": [hash_file(path) for path in voiceovers],
+            "images": [hash_file(path) for path in frames],
+        }
+        video_path = self._cached_files("video", [params], render)[0]
+        print(f"Video created at: {video_path}")
+
+        if quality == "draft":
+            # Pin copies of the exact inputs next to the draft; the cached originals
+            # may be evicted before the draft is promoted
+            with MovieCutter(sentences, voiceovers, frames, renderer=self.renderer, size=self.reel_size) as movie:
+                movie.write_manifest(self._manifest_path(), inputs_dir=self._draft_inputs_dir())
+        return video_path
+
+    def _manifest_path(self):
+        return os.path.join(self.output_path, f"{self.video_id}_manifest.json")
+
+    def _draft_inputs_dir(self):
+        return os.path.join(self.output_path, f"{self.video_id}_draft_inputs")
+
+    def _publish(self, video_path):
+        #Upload the video to a webhosting service
+        with self.tracer.span("upload"):
             video_url = self.cloudUploader.upload_to_cloudinary(video_path)
 
-            if video_url:
-                print(f"Cloud upload successful. Use this URL for Instagram: {video_url}")
-            else:
-                print("Cloudinary upload failed.")
+        if video_url:
+            print(f"Cloud upload successful. Use this URL for Instagram: {video_url}")
+        else:
+            print("Cloudinary upload failed.")
 
-            #Upload the video from the URL to Instagram
+        #Upload the video from the URL to Instagram
+        with self.tracer.span("publish"):
             container_id = self.reelPublisher.upload_reel_to_instagram(video_url)
 
             if container_id and self.reelPublisher.check_media_status(container_id):
@@ -77,8 +419,97 @@ class Engine:
             else:
                 print("Failed to upload or process Reel.")
 
+    def process_video(self, draft=False):
+        """
+        Run the whole pipeline. With `draft` only a low-resolution preview is
+        rendered and nothing is published; call `promote()` to render and publish
+        the full-quality reel from the same inputs.
+        """
+        quality = "draft" if draft else "full"
+        try:
+            # The stages form a small graph: search terms + images and voiceovers
+            # only depend on the script sentences, so they run concurrently
+            scheduler = self.scheduler or StageScheduler(self.stage_concurrency)
+            stages = {
+                "transcript": (self._transcribe, []),
+                "script": (self._generate_script, ["transcript"]),
+                "sentences": (self._process_script, ["script"]),
+                "images": (
+                    lambda sentences: self._search_terms_and_images(scheduler, sentences),
+                    ["sentences"],
+                ),
+                "voiceovers": (self._generate_voiceovers, ["sentences"]),
+                "frames": (self._normalize_images, ["images"]),
+                "video": (
+                    lambda sentences, voiceovers, frames: self._render(sentences, voiceovers, frames, quality),
+                    ["sentences", "voiceovers", "frames"],
+                ),
+            }
+            self.completed_stages = []
+            self.stage_times = {}
+            try:
+                results = scheduler.run({
+                    name: (
+                        self._stage(
+                            name, func, len(stages),
+                            scheduler.limit(name) if name in LIMITED_STAGES else None,
+                        ),
+                        deps,
+                    )
+                    for name, (func, deps) in stages.items()
+                })
+            finally:
+                if self.scheduler is None:
+                    scheduler.shutdown()
+                if self.owns_scraper:
+                    self.scraper.close()
+                if self.owns_normalizer:
+                    self.normalizer.close()
+
+            self.video_path = results["video"]
+            if draft:
+                self.draft_path = self.video_path
+                print(f"Draft ready for review: {self.draft_path}")
+                return True
+
+            self._publish(self.video_path)
             return True
 
         except Exception as e:
+            self.error = str(e)
             print(f"Error processing video: {e}")
-            return False
\ No newline at end of file
+            return False
+        finally:
+            self.export_trace()
+
+    def promote(self):
+        """
+        Render the full-quality reel from exactly the inputs of the last draft and publish it.
+
+        The inputs are read from the draft's manifest, so a draft can also be promoted
+        by a new Engine for the same video, e.g. in another session or worker.
+        """
+        try:
+            manifest_path = self._manifest_path()
+            if not os.path.exists(manifest_path):
+                raise ValueError("No draft to promote. Call process_video(draft=True) first.")
+            # Fails with FileNotFoundError if any pinned input is missing
+            with MovieCutter.from_manifest(manifest_path) as movie:
+                sentences, voiceovers, frames = (list(column) for column in zip(*movie.pairs))
+
+            self.completed_stages = []
+            render = self._stage("video", self._render, 1)
+            self.video_path = render(sentences, voiceovers, frames, "full")
+            self._publish(self.video_path)
+
+            # The pinned draft inputs are no longer needed
+            shutil.rmtree(self._draft_inputs_dir(), ignore_errors=True)
+            os.remove(manifest_path)
+            return True
+
+        except Exception as e:
+            self.error = str(e)
+            print(f"Error promoting video: {e}")
+            return False
+        finally:
+            self.export_trace()
@@ -0,0 +1,175 @@
+import glob
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+
+def hash_text(text):
+    """Return the SHA-256 hex digest of a string."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def hash_file(file_path, chunk_size=1 << 20):
+    """Return the SHA-256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ArtifactCache:
+    def __init__(self, cache_dir="cache", max_bytes=5 * 1024 ** 3, low_water=0.9):
+        """
+        Persistent on-disk cache for pipeline stage outputs.
+
+        Entries are stored as `<cache_dir>/<stage>/<key><ext>`, where the key is a
+        hash of everything the stage output depends on. When the cache grows past
+        `max_bytes`, the least recently used entries are evicted until it is back
+        under `low_water` times that size.
+
+        The total size is scanned from disk once and then kept as a running sum of
+        the writes, so a put only walks the cache when an eviction is due. Writes
+        of other processes sharing the directory are picked up by that scan.
+
+        :param cache_dir: Directory holding the cache (str)
+        :param max_bytes: Size limit of the whole cache in bytes (int)
+        :param low_water: Fraction of `max_bytes` an eviction shrinks the cache to (float)
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.low_water = low_water
+        self._lock = threading.Lock()
+        self._total = None
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(stage, **params):
+        """
+        Build a cache key from a stage name and the parameters its output depends on.
+        The parameters must be JSON serializable.
+        """
+        payload = json.dumps({"stage": stage, **params}, sort_keys=True, ensure_ascii=False)
+        return hash_text(payload)
+
+    def _stage_dir(self, stage):
+        stage_dir = os.path.join(self.cache_dir, stage)
+        os.makedirs(stage_dir, exist_ok=True)
+        return stage_dir
+
+    def get_file(self, stage, key):
+        """
+        Return the path of the cached file for `key`, or None on a miss.
+        """
+        matches = glob.glob(os.path.join(self._stage_dir(stage), key + ".*"))
+        if not matches:
+            return None
+        # Mark as recently used for the LRU eviction
+        os.utime(matches[0])
+        return matches[0]
+
+    def put_file(self, stage, key, src_path):
+        """
+        Copy `src_path` into the cache under `key` and return the cached path.
+        The file extension of the source is kept.
+        """
+        ext = os.path.splitext(src_path)[1] or ".bin"
+        dst_path = os.path.join(self._stage_dir(stage), key + ext)
+
+        # Copy to a temporary file first so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self._stage_dir(stage), suffix=".tmp")
+        os.close(fd)
+        shutil.copyfile(src_path, tmp_path)
+        self._commit(tmp_path, dst_path)
+        return dst_path
+
+    def get_json(self, stage, key):
+        """
+        Return the cached JSON value for `key`, or None on a miss.
+        """
+        file_path = self.get_file(stage, key)
+        if file_path is None:
+            return None
+        with open(file_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def put_json(self, stage, key, value):
+        """
+        Store a JSON-serializable value under `key`.
+        """
+        dst_path = os.path.join(self._stage_dir(stage), key + ".json")
+        fd, tmp_path = tempfile.mkstemp(dir=self._stage_dir(stage), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False)
+        self._commit(tmp_path, dst_path)
+        return dst_path
+
+    def _commit(self, tmp_path, dst_path):
+        """
+        Move a written temporary file into place, add its size to the running
+        total and evict if the cache is now over its limit.
+        """
+        added = os.path.getsize(tmp_path)
+        with self._lock:
+            try:
+                # An overwritten entry no longer counts
+                added -= os.path.getsize(dst_path)
+            except FileNotFoundError:
+                pass
+            os.replace(tmp_path, dst_path)
+            if self._total is not None:
+                self._total += added
+                if self._total <= self.max_bytes:
+                    return
+            self._evict_locked()
+
+    def size(self):
+        """Return the total size of all cache entries in bytes."""
+        return sum(size for _, size, _ in self._entries())
+
+    def _entries(self):
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def evict(self):
+        """
+        Rescan the cache and, if it is over `max_bytes`, delete least recently
+        used entries until it is under `low_water` times that size.
+        """
+        with self._lock:
+            self._evict_locked()
+
+    def _evict_locked(self):
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        if total > self.max_bytes:
+            target = self.max_bytes * self.low_water
+            for path, size, _ in sorted(entries, key=lambda entry: entry[2]):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                if total <= target:
+                    break
+        self._total = total
+
+    def clear(self):
+        """Remove every entry from the cache."""
+        with self._lock:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._total = 0
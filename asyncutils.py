@@ -0,0 +1,14 @@
+import asyncio
+
+
+def run_coroutine(coroutine):
+    """
+    Run a coroutine to completion on this thread's event loop.
+    Threads other than the main thread get their own loop on first use.
+    """
+    try:
+        loop = asyncio.get_event_loop()
+    except RuntimeError:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+    return loop.run_until_complete(coroutine)
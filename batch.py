@@ -0,0 +1,240 @@
+"""
+Batch mode: turn a list of YouTube URLs into reels without the Streamlit UI.
+
+Models, the image scraper (browsers or HTTP session), the TTS client and the
+caches are created once and shared by all videos. Several videos are processed
+at once, and the stage limits apply across all of them.
+
+Usage:
+    python batch.py urls.txt [--parallel 2] [--stage-concurrency images=4 video=2] [--summary summary.json]
+"""
+import argparse
+import json
+import os
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from appworkflow import Engine, DEFAULT_STAGE_CONCURRENCY
+from artifactcache import ArtifactCache
+from imagecache import ImageCache
+from imagescraper import ImageScraper
+from imagenormalizer import ImageNormalizer
+from modelregistry import registry
+from stagescheduler import StageScheduler
+from TextToSpeechTransformer import TextToSpeechTransformer
+
+
+def read_urls(path):
+    """Read one URL per line, skipping blank lines, comments and duplicates."""
+    urls = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            url = line.strip()
+            if url and not url.startswith("#") and url not in urls:
+                urls.append(url)
+    return urls
+
+
+def parse_concurrency(values):
+    """Parse ['images=4', 'video=2'] into {'images': 4, 'video': 2}."""
+    concurrency = {}
+    for value in values or []:
+        stage, _, limit = value.partition("=")
+        if not limit.isdigit():
+            raise ValueError(f"Expected stage=limit, got '{value}'")
+        concurrency[stage] = int(limit)
+    return concurrency
+
+
+class BatchRunner:
+    def __init__(self, parallel=2, stage_concurrency=None, draft=False, output_path="downloads",
+                 whisper_model="base", image_backend="http", renderer="ffmpeg", use_cache=True,
+                 trace_dir=None, profile_stages=()):
+        """
+        Processes many videos with one shared set of models, sessions and caches.
+
+        :param parallel: Number of videos processed at once (int)
+        :param stage_concurrency: Limits per stage across all videos, e.g. {"images": 4, "video": 2} (dict)
+        :param draft: Render low-resolution drafts and do not publish (bool)
+        :param image_backend: 'selenium' or 'http' (str)
+        :param trace_dir: Directory for the per-video traces, None to disable them (str)
+        :param profile_stages: Stages captured with cProfile (tuple)
+        """
+        self.parallel = parallel
+        self.draft = draft
+        self.output_path = output_path
+        self.whisper_model = whisper_model
+        self.renderer = renderer
+        self.trace_dir = trace_dir
+        self.profile_stages = tuple(profile_stages)
+        self.stage_concurrency = {**DEFAULT_STAGE_CONCURRENCY, **(stage_concurrency or {})}
+
+        self.cache = ArtifactCache() if use_cache else None
+        self.scheduler = StageScheduler(self.stage_concurrency, max_workers=max(8, 4 * parallel))
+        self.scraper = ImageScraper(
+            save_folder="images",
+            pool_size=self.stage_concurrency["images"],
+            backend=image_backend,
+            cache=ImageCache() if use_cache else None,
+        )
+        self.transformer = TextToSpeechTransformer(
+            cache=self.cache, max_concurrency=self.stage_concurrency["voiceovers"]
+        )
+        # One pool of normalizer processes for all videos instead of one per video
+        self.normalizer = ImageNormalizer(cache=self.cache, workers=os.cpu_count())
+
+    def warm_up(self):
+        """Load the models once before the first video, so the timings only cover the work."""
+        start = time.perf_counter()
+        registry.get_llamarizer(use_cuda=False)
+        registry.get_whisper(self.whisper_model)
+        print(f"Models loaded in {time.perf_counter() - start:.1f}s")
+
+    def process(self, video_url):
+        """
+        Process one video with the shared resources.
+
+        :return: Dict with the outcome, wall time and per-stage times of the video
+        """
+        start = time.perf_counter()
+        try:
+            engine = Engine(
+                video_url,
+                output_path=self.output_path,
+                whisper_model=self.whisper_model,
+                cache=self.cache,
+                use_cache=self.cache is not None,
+                stage_concurrency=self.stage_concurrency,
+                renderer=self.renderer,
+                scraper=self.scraper,
+                transformer=self.transformer,
+                normalizer=self.normalizer,
+                scheduler=self.scheduler,
+                trace_dir=self.trace_dir,
+                profile_stages=self.profile_stages,
+            )
+        except Exception as e:
+            return {
+                "url": video_url, "ok": False, "video_path": None, "error": str(e),
+                "seconds": time.perf_counter() - start, "stage_times": {}, "transcript_source": None,
+            }
+
+        ok = engine.process_video(draft=self.draft)
+        return {
+            "url": video_url,
+            "ok": ok,
+            "video_path": engine.video_path,
+            "error": None if ok else engine.error,
+            "seconds": time.perf_counter() - start,
+            "stage_times": dict(engine.stage_times),
+            "transcript_source": engine.transcript_source,
+        }
+
+    def run(self, urls):
+        """
+        Process all URLs and return the throughput summary.
+        """
+        self.warm_up()
+        start = time.perf_counter()
+        results = []
+        with ThreadPoolExecutor(max_workers=self.parallel, thread_name_prefix="video") as executor:
+            for result in executor.map(self.process, urls):
+                status = "done" if result["ok"] else f"FAILED: {result['error']}"
+                print(f"[{len(results) + 1}/{len(urls)}] {result['url']} {status} ({result['seconds']:.0f}s)")
+                results.append(result)
+        return summarize(results, time.perf_counter() - start)
+
+    def close(self):
+        self.scheduler.shutdown()
+        self.scraper.close()
+        self.normalizer.close()
+
+
+def summarize(results, elapsed):
+    """
+    Build the throughput summary of a batch run.
+
+    :param elapsed: Wall time of the whole batch in seconds (float)
+    """
+    succeeded = [result for result in results if result["ok"]]
+    stage_totals = {}
+    for result in results:
+        for stage, seconds in result["stage_times"].items():
+            stage_totals.setdefault(stage, []).append(seconds)
+
+    return {
+        "videos": len(results),
+        "succeeded": len(succeeded),
+        "failed": len(results) - len(succeeded),
+        "elapsed_seconds": round(elapsed, 1),
+        "reels_per_hour": round(len(succeeded) / elapsed * 3600, 2) if elapsed else 0.0,
+        "stage_seconds": {
+            stage: {"total": round(sum(times), 1), "mean": round(sum(times) / len(times), 1)}
+            for stage, times in stage_totals.items()
+        },
+        "failures": [{"url": result["url"], "error": result["error"]} for result in results if not result["ok"]],
+        "results": results,
+    }
+
+
+def print_summary(summary):
+    print(f"\nProcessed {summary['videos']} videos in {summary['elapsed_seconds']:.0f}s: "
+          f"{summary['succeeded']} succeeded, {summary['failed']} failed, "
+          f"{summary['reels_per_hour']} reels/hour")
+    print(f"{'stage':<14}{'total s':>10}{'mean s':>10}")
+    for stage, times in summary["stage_seconds"].items():
+        print(f"{stage:<14}{times['total']:>10}{times['mean']:>10}")
+    for failure in summary["failures"]:
+        print(f"FAILED {failure['url']}: {failure['error']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Turn a file of YouTube URLs into reels.")
+    parser.add_argument("urls_file", help="Text file with one YouTube URL per line")
+    parser.add_argument("--parallel", type=int, default=2, help="Number of videos processed at once")
+    parser.add_argument("--stage-concurrency", nargs="*", metavar="STAGE=N",
+                        help="Limits per stage across all videos, e.g. images=4 transcript=1 video=2")
+    parser.add_argument("--draft", action="store_true", help="Render low-resolution drafts and do not publish")
+    parser.add_argument("--output-path", default="downloads", help="Directory for downloads and rendered reels")
+    parser.add_argument("--whisper-model", default="base", help="Whisper model size")
+    parser.add_argument("--image-backend", choices=["selenium", "http"], default="http")
+    parser.add_argument("--renderer", choices=["moviepy", "ffmpeg", "segments"], default="ffmpeg")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the artifact and image caches")
+    parser.add_argument("--trace-dir", help="Write per-stage traces (JSON lines and Chrome trace) to this directory")
+    parser.add_argument("--profile-stage", action="append", default=[], metavar="STAGE",
+                        help="Capture this stage with cProfile, can be repeated")
+    parser.add_argument("--summary", help="Write the throughput summary as JSON to this file")
+    args = parser.parse_args()
+
+    try:
+        stage_concurrency = parse_concurrency(args.stage_concurrency)
+    except ValueError as e:
+        parser.error(str(e))
+
+    urls = read_urls(args.urls_file)
+    runner = BatchRunner(
+        parallel=args.parallel,
+        stage_concurrency=stage_concurrency,
+        draft=args.draft,
+        output_path=args.output_path,
+        whisper_model=args.whisper_model,
+        image_backend=args.image_backend,
+        renderer=args.renderer,
+        use_cache=not args.no_cache,
+        trace_dir=args.trace_dir,
+        profile_stages=args.profile_stage,
+    )
+    try:
+        summary = runner.run(urls)
+    finally:
+        runner.close()
+
+    print_summary(summary)
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+#!pip install pillow
+
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+from contextlib import contextmanager
+
+from artifactcache import hash_file
+
+
+def _normalize_query(query):
+    """Queries differing only in case or whitespace share one cache entry."""
+    return " ".join(query.lower().split())
+
+
+def perceptual_hash(file_path, hash_size=8):
+    """
+    Compute a 64-bit difference hash (dHash) of an image.
+
+    The image is reduced to a (hash_size + 1) x hash_size grayscale grid and each
+    bit records whether a pixel is brighter than its right neighbour, so resized
+    or re-encoded copies of the same picture get the same or a very close hash.
+
+    :return: The hash as an int, or None if the image cannot be decoded
+    """
+    try:
+        from PIL import Image
+
+        with Image.open(file_path) as image:
+            pixels = list(
+                image.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS).getdata()
+            )
+    except Exception:
+        return None
+
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+class ImageCache:
+    def __init__(self, cache_dir="image_cache", ttl_seconds=30 * 24 * 3600, max_queries=2000,
+                 phash_threshold=4):
+        """
+        Persistent cache mapping search queries to downloaded images.
+
+        Images are stored once by content hash. An image whose perceptual hash is
+        within `phash_threshold` bits of a stored one is treated as a duplicate and
+        the stored file is reused, so the same picture is kept once across reels.
+
+        :param cache_dir: Directory holding the index and the image files (str)
+        :param ttl_seconds: Age after which a query has to be searched again (int)
+        :param max_queries: Number of queries kept; least recently used ones are evicted (int)
+        :param phash_threshold: Maximum Hamming distance for near-duplicate images (int)
+        """
+        self.cache_dir = cache_dir
+        self.images_dir = os.path.join(cache_dir, "images")
+        self.ttl_seconds = ttl_seconds
+        self.max_queries = max_queries
+        self.phash_threshold = phash_threshold
+        self.db_path = os.path.join(cache_dir, "index.sqlite3")
+        self._lock = threading.Lock()
+
+        os.makedirs(self.images_dir, exist_ok=True)
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS images ("
+                "sha256 TEXT PRIMARY KEY, phash TEXT, path TEXT NOT NULL, "
+                "size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS queries ("
+                "query TEXT PRIMARY KEY, sha256 TEXT NOT NULL, "
+                "created REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        """Open the index, commit on success and always close the connection."""
+        db = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def lookup(self, query):
+        """
+        Return the cached image path for `query`, or None on a miss or expired entry.
+        """
+        query = _normalize_query(query)
+        now = time.time()
+
+        with self._lock, self._connect() as db:
+            row = db.execute(
+                "SELECT q.created, i.path, i.sha256 FROM queries q JOIN images i ON q.sha256 = i.sha256 "
+                "WHERE q.query = ?",
+                (query,),
+            ).fetchone()
+            if row is None:
+                return None
+
+            created, path, sha256 = row
+            if now - created > self.ttl_seconds or not os.path.exists(path):
+                db.execute("DELETE FROM queries WHERE query = ?", (query,))
+                self._remove_orphans(db)
+                return None
+
+            db.execute("UPDATE queries SET last_used = ? WHERE query = ?", (now, query))
+            db.execute("UPDATE images SET last_used = ? WHERE sha256 = ?", (now, sha256))
+            return path
+
+    def store(self, query, file_path):
+        """
+        Add a downloaded image for `query` and return the path of the stored copy.
+        Exact and near-duplicate images are not stored twice.
+        """
+        query = _normalize_query(query)
+        now = time.time()
+        sha256 = hash_file(file_path)
+        phash = perceptual_hash(file_path)
+
+        with self._lock, self._connect() as db:
+            row = db.execute("SELECT sha256, path FROM images WHERE sha256 = ?", (sha256,)).fetchone()
+            if row is None and phash is not None:
+                row = self._find_near_duplicate(db, phash)
+
+            if row is not None:
+                sha256, stored_path = row
+            else:
+                ext = os.path.splitext(file_path)[1] or ".jpg"
+                stored_path = os.path.join(self.images_dir, sha256 + ext)
+                shutil.copyfile(file_path, stored_path)
+                db.execute(
+                    "INSERT INTO images (sha256, phash, path, size, last_used) VALUES (?, ?, ?, ?, ?)",
+                    (sha256, None if phash is None else f"{phash:016x}", stored_path,
+                     os.path.getsize(stored_path), now),
+                )
+
+            db.execute(
+                "INSERT OR REPLACE INTO queries (query, sha256, created, last_used) VALUES (?, ?, ?, ?)",
+                (query, sha256, now, now),
+            )
+            db.execute("UPDATE images SET last_used = ? WHERE sha256 = ?", (now, sha256))
+            self._evict(db)
+
+        return stored_path
+
+    def _find_near_duplicate(self, db, phash):
+        best = None
+        best_distance = self.phash_threshold + 1
+        for sha256, stored_phash, path in db.execute(
+            "SELECT sha256, phash, path FROM images WHERE phash IS NOT NULL"
+        ):
+            distance = bin(int(stored_phash, 16) ^ phash).count("1")
+            if distance < best_distance and os.path.exists(path):
+                best, best_distance = (sha256, path), distance
+        return best
+
+    def _evict(self, db):
+        """Drop the least recently used queries beyond `max_queries`, then unreferenced images."""
+        db.execute(
+            "DELETE FROM queries WHERE query IN ("
+            "SELECT query FROM queries ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_queries,),
+        )
+        db.execute("DELETE FROM queries WHERE created < ?", (time.time() - self.ttl_seconds,))
+        self._remove_orphans(db)
+
+    def _remove_orphans(self, db):
+        orphans = db.execute(
+            "SELECT sha256, path FROM images WHERE sha256 NOT IN (SELECT sha256 FROM queries)"
+        ).fetchall()
+        for sha256, path in orphans:
+            if os.path.exists(path):
+                os.remove(path)
+            db.execute("DELETE FROM images WHERE sha256 = ?", (sha256,))
+
+    def stats(self):
+        """Return the number of cached queries, stored images and their total size in bytes."""
+        with self._lock, self._connect() as db:
+            queries = db.execute("SELECT COUNT(*) FROM queries").fetchone()[0]
+            images, size = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM images").fetchone()
+        return {"queries": queries, "images": images, "bytes": size}
@@ -0,0 +1,135 @@
+#!pip install pillow
+
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from artifactcache import ArtifactCache, hash_file
+
+
+def normalize_image(src_path, dst_path, size, mode="letterbox", background=(0, 0, 0), quality=90):
+    """
+    Decode an image once and write it as a baseline RGB JPEG of exactly `size`.
+    Runs in a worker process of ImageNormalizer.
+
+    :param size: Target (width, height) (tuple)
+    :param mode: 'letterbox' fits the whole image and pads with `background`,
+                 'crop' fills the frame and crops the overflow around the center (str)
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(src_path) as image:
+        image = ImageOps.exif_transpose(image)
+
+        # Flatten transparency onto the background instead of dropping the alpha channel
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            flattened = Image.new("RGB", image.size, background)
+            flattened.paste(image, mask=image.getchannel("A"))
+            image = flattened
+        else:
+            image = image.convert("RGB")
+
+        if mode == "crop":
+            frame = ImageOps.fit(image, size, Image.LANCZOS)
+        else:
+            width, height = size
+            scale = min(width / image.width, height / image.height)
+            resized = image.resize(
+                (max(1, round(image.width * scale)), max(1, round(image.height * scale))),
+                Image.LANCZOS,
+            )
+            frame = Image.new("RGB", size, background)
+            frame.paste(resized, ((width - resized.width) // 2, (height - resized.height) // 2))
+
+    tmp_path = dst_path + ".part"
+    frame.save(tmp_path, "JPEG", quality=quality, subsampling="4:2:0")
+    os.replace(tmp_path, dst_path)
+    return dst_path
+
+
+class ImageNormalizer:
+    def __init__(self, size=(1080, 1920), mode="letterbox", output_dir="normalized_images",
+                 workers=None, quality=90, background=(0, 0, 0), cache=None, max_bytes=2 * 1024 ** 3):
+        """
+        Brings scraped images of arbitrary size and format to one fixed reel frame.
+
+        :param size: Target (width, height) of every frame (tuple)
+        :param mode: 'letterbox' or 'crop' (str)
+        :param output_dir: Directory of the frame cache if no `cache` is given (str)
+        :param workers: Number of worker processes, defaults to the CPU count. The pool is started
+                        on first use and shared by all `normalize` calls, also from several threads (int)
+        :param quality: JPEG quality of the written frames (int)
+        :param background: RGB color used for padding and transparent areas (tuple)
+        :param cache: ArtifactCache to keep the frames in, sharing its size limit and LRU
+                      eviction with the other stages (ArtifactCache)
+        :param max_bytes: Size limit of the frame cache if no `cache` is given (int)
+        """
+        if mode not in ("letterbox", "crop"):
+            raise ValueError(f"Unknown normalization mode: {mode}")
+
+        self.size = tuple(size)
+        self.mode = mode
+        self.output_dir = output_dir
+        self.workers = workers
+        self.quality = quality
+        self.background = tuple(background)
+        self.cache = cache or ArtifactCache(output_dir, max_bytes)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def _pool(self):
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def close(self):
+        """Stop the worker processes. A later `normalize` call starts a new pool."""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+    def _frame_key(self, image_path):
+        # Keyed by the source content, so the same image is only normalized once
+        return ArtifactCache.make_key(
+            "frame",
+            source=hash_file(image_path),
+            size=list(self.size),
+            mode=self.mode,
+            quality=self.quality,
+            background=list(self.background),
+        )
+
+    def normalize(self, image_paths):
+        """
+        Normalize a list of images, reusing frames produced earlier.
+
+        :param image_paths: Paths of the source images (list)
+        :return: Paths of the normalized frames, in the same order (list)
+        """
+        keys = [self._frame_key(path) for path in image_paths]
+        output_paths = [self.cache.get_file("frame", key) for key in keys]
+        jobs = {
+            key: src for src, key, dst in zip(image_paths, keys, output_paths)
+            if dst is None
+        }
+        if not jobs:
+            return output_paths
+
+        print(f"Normalizing {len(jobs)} images to {self.size[0]}x{self.size[1]}...")
+        executor = self._pool()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            futures = {
+                key: executor.submit(
+                    normalize_image, src, os.path.join(tmp_dir, f"{key}.jpg"),
+                    self.size, self.mode, self.background, self.quality,
+                )
+                for key, src in jobs.items()
+            }
+            # Frames enter the cache as they finish; its LRU eviction bounds the disk usage
+            stored = {key: self.cache.put_file("frame", key, future.result()) for key, future in futures.items()}
+
+        return [path if path is not None else stored[key] for key, path in zip(keys, output_paths)]
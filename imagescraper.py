@@ -1,22 +1,194 @@
 #!pip install selenium requests
+#!pip install aiohttp
 
 
+import asyncio
+import html
+import json
+import re
 import time
 import os
+import queue
+import threading
 import requests
 
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.firefox.service import Service
-from selenium.webdriver.firefox.options import Options
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+
+BING_IMAGES_URL = "https://www.bing.com/images/search"
+
+# Bing serves a reduced page without result metadata to unknown clients
+HTTP_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+    ),
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
+# File extensions for the image types we accept
+IMAGE_EXTENSIONS = {
+    "image/jpeg": ".jpg",
+    "image/jpg": ".jpg",
+    "image/png": ".png",
+    "image/webp": ".webp",
+    "image/gif": ".gif",
+    "image/bmp": ".bmp",
+}
+
+
+def parse_bing_image_urls(page_html, num_images=10):
+    """
+    Extract image URLs from a Bing Images results page.
+
+    Every result anchor carries its metadata as JSON in an `m` attribute; the
+    full-size image is `murl` and the Bing thumbnail `turl`. Pages without that
+    metadata fall back to the `img.mimg` thumbnails used by the Selenium backend.
+
+    :param page_html: HTML of the results page (str)
+    :param num_images: Maximum number of URLs to return (int)
+    :return: List of image URLs in result order (list)
+    """
+    image_urls = []
+
+    for raw_metadata in re.findall(r'\bm="(\{.*?\})"', page_html):
+        try:
+            metadata = json.loads(html.unescape(raw_metadata))
+        except ValueError:
+            continue
+        url = metadata.get("murl") or metadata.get("turl")
+        if url and url.startswith("http") and url not in image_urls:
+            image_urls.append(url)
+        if len(image_urls) >= num_images:
+            return image_urls
+
+    if not image_urls:
+        for tag in re.findall(r'<img[^>]*class="[^"]*\bmimg\b[^"]*"[^>]*>', page_html):
+            match = re.search(r'\b(?:src|data-src)="(http[^"]+)"', tag)
+            if match:
+                url = html.unescape(match.group(1))
+                if url not in image_urls:
+                    image_urls.append(url)
+            if len(image_urls) >= num_images:
+                break
+
+    return image_urls[:num_images]
+
+
+class DriverPool:
+    def __init__(self, create_driver, size=2, max_uses=50):
+        """
+        Pool of long-lived WebDriver instances shared between queries.
+
+        Drivers are started lazily, health-checked before every use and
+        recycled after `max_uses` queries or when they stop responding.
+
+        :param create_driver: Zero-argument callable returning a new WebDriver
+        :param size: Maximum number of drivers alive at once (int)
+        :param max_uses: Number of queries after which a driver is restarted (int)
+        """
+        self.create_driver = create_driver
+        self.size = size
+        self.max_uses = max_uses
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._uses = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _is_healthy(self, driver):
+        try:
+            driver.execute_script("return 1")
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, driver):
+        with self._lock:
+            self._uses.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def acquire(self):
+        """
+        Take a healthy driver from the pool, starting one if none is idle.
+        Blocks while all `size` drivers are busy.
+        """
+        if self._closed:
+            raise RuntimeError("Driver pool is closed")
+
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    driver = self._idle.get_nowait()
+                except queue.Empty:
+                    driver = self.create_driver()
+                    with self._lock:
+                        self._uses[id(driver)] = 0
+                    return driver
+
+                if self._is_healthy(driver):
+                    return driver
+                print("Recycling unresponsive browser driver")
+                self._discard(driver)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, driver, broken=False):
+        """
+        Return a driver to the pool. Drivers that failed or reached
+        `max_uses` are quit instead of being reused.
+        """
+        try:
+            with self._lock:
+                uses = self._uses.get(id(driver), 0) + 1
+                self._uses[id(driver)] = uses
+
+            if broken or self._closed or uses >= self.max_uses:
+                self._discard(driver)
+            else:
+                self._idle.put(driver)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """Quit all idle drivers. Drivers still in use are quit when released."""
+        self._closed = True
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(driver)
+
 
 class ImageScraper:
-    def __init__(self, save_folder="images"):
+    def __init__(self, save_folder="images", pool_size=2, max_driver_uses=50, backend="selenium",
+                 search_url=BING_IMAGES_URL, max_concurrent_queries=8, request_timeout=10,
+                 download_workers=8, max_image_bytes=10 * 1024 * 1024, num_candidates=3, cache=None):
         """
         Initialize ImageScraper with a save folder for downloaded images.
         
         :param save_folder: Directory to save downloaded images (str)
+        :param pool_size: Number of browsers kept open and queried in parallel (int)
+        :param max_driver_uses: Number of queries after which a browser is restarted (int)
+        :param backend: 'selenium' to search through headless Firefox, or 'http' to fetch
+                        and parse the results page directly without a browser (str)
+        :param search_url: Bing Images search endpoint used by the 'http' backend (str)
+        :param max_concurrent_queries: Queries in flight at once with the 'http' backend, across
+                                       all threads sharing this scraper (int)
+        :param request_timeout: Timeout in seconds for HTTP requests (int)
+        :param download_workers: Image downloads running in parallel (int)
+        :param max_image_bytes: Downloads larger than this are aborted (int)
+        :param num_candidates: Image URLs collected per prompt, tried in order until one downloads (int)
+        :param cache: Optional ImageCache; prompts found in it skip search and download (ImageCache)
         """
+        if backend not in ("selenium", "http"):
+            raise ValueError(f"Unknown image search backend: {backend}")
         self.save_folder = save_folder
         os.makedirs(save_folder, exist_ok=True)
         
@@ -24,6 +196,57 @@ class ImageScraper:
         self.current_dir = os.path.dirname(os.path.abspath(__file__))
         self.driver_path = os.path.join(self.current_dir, "geckodriver.exe")
 
+        self.backend = backend
+        self.search_url = search_url
+        self.max_concurrent_queries = max_concurrent_queries
+        self.request_timeout = request_timeout
+        self.download_workers = download_workers
+        self.max_image_bytes = max_image_bytes
+        self.num_candidates = num_candidates
+        self.cache = cache
+
+        # One session for all downloads so connections are reused across images
+        self.session = requests.Session()
+        self.session.headers.update(HTTP_HEADERS)
+        adapter = HTTPAdapter(pool_connections=download_workers, pool_maxsize=download_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        # The 'http' backend searches on one background event loop with one aiohttp session,
+        # so every calling thread shares its connections and its query limit
+        self._search_loop = None
+        self._search_thread = None
+        self._search_session = None
+        self._search_semaphore = None
+        self._search_lock = threading.Lock()
+
+        self.pool_size = pool_size
+        self.driver_pool = None
+        if backend == "selenium":
+            self.driver_pool = DriverPool(self._setup_driver, size=pool_size, max_uses=max_driver_uses)
+
+    def close(self):
+        """Quit all pooled browsers and close pooled HTTP connections."""
+        if self.driver_pool is not None:
+            self.driver_pool.close()
+        self.session.close()
+
+        with self._search_lock:
+            loop, self._search_loop = self._search_loop, None
+        if loop is not None:
+            if self._search_session is not None:
+                asyncio.run_coroutine_threadsafe(self._search_session.close(), loop).result()
+                self._search_session = None
+            loop.call_soon_threadsafe(loop.stop)
+            self._search_thread.join()
+            loop.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
     def _setup_driver(self, headless=True):
         """
         Set up and return a Firefox webdriver instance.
@@ -31,6 +254,11 @@ class ImageScraper:
         :param headless: Run Firefox in headless mode if True (bool)
         :return: Firefox WebDriver instance
         """
+        # Only the Selenium backend needs the browser stack
+        from selenium import webdriver
+        from selenium.webdriver.firefox.service import Service
+        from selenium.webdriver.firefox.options import Options
+
         firefox_options = Options()
         if headless:
             firefox_options.add_argument("--headless")
@@ -41,89 +269,250 @@ class ImageScraper:
     def scrape_bing_images(self, query, num_images=10, headless=True):
         """
         Scrapes Bing Images using Selenium (Firefox) and returns a list of image URLs.
+        The browser is taken from the driver pool; `headless=False` starts a
+        dedicated visible browser instead.
 
         :param query: The search query (str)
         :param num_images: Number of image links to collect (int)
         :param headless: Run Firefox in headless mode if True (bool)
         :return: List of image URLs (list)
         """
-        driver = self._setup_driver(headless)
-        image_urls = set()
+        if self.backend == "http":
+            return self.search_images_http([query], num_images)[0]
+
+        if not headless:
+            driver = self._setup_driver(headless)
+            try:
+                return self._collect_image_urls(driver, query, num_images)
+            finally:
+                driver.quit()
 
+        driver = self.driver_pool.acquire()
+        broken = True
         try:
-            # 1) Go to Bing Images search
-            search_url = f"https://www.bing.com/images/search?q={query}&form=QBLH"
-            driver.get(search_url)
-
-            last_height = driver.execute_script("return document.body.scrollHeight")
-
-            # 2) Scroll and collect image URLs until we have enough
-            while len(image_urls) < num_images:
-                driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                time.sleep(2)  # Let images load
-
-                # Find thumbnail <img> elements
-                thumbnails = driver.find_elements(By.CSS_SELECTOR, "img.mimg")
-
-                for img in thumbnails:
-                    src = img.get_attribute("src")
-                    if src and "http" in src:
-                        image_urls.add(src)
-                    if len(image_urls) >= num_images:
-                        break
-
-                # Check if we've reached the bottom (no more loading)
-                new_height = driver.execute_script("return document.body.scrollHeight")
-                if new_height == last_height:
+            image_urls = self._collect_image_urls(driver, query, num_images)
+            broken = False
+            return image_urls
+        finally:
+            self.driver_pool.release(driver, broken=broken)
+
+    def _collect_image_urls(self, driver, query, num_images):
+        """
+        Run one Bing Images query in `driver` and collect up to `num_images` URLs.
+        """
+        from selenium.webdriver.common.by import By
+
+        image_urls = set()
+
+        # 1) Go to Bing Images search
+        search_url = f"https://www.bing.com/images/search?q={query}&form=QBLH"
+        driver.get(search_url)
+
+        last_height = driver.execute_script("return document.body.scrollHeight")
+
+        # 2) Scroll and collect image URLs until we have enough
+        while len(image_urls) < num_images:
+            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+            time.sleep(2)  # Let images load
+
+            # Find thumbnail <img> elements
+            thumbnails = driver.find_elements(By.CSS_SELECTOR, "img.mimg")
+
+            for img in thumbnails:
+                src = img.get_attribute("src")
+                if src and "http" in src:
+                    image_urls.add(src)
+                if len(image_urls) >= num_images:
                     break
-                last_height = new_height
 
-        finally:
-            driver.quit()
+            # Check if we've reached the bottom (no more loading)
+            new_height = driver.execute_script("return document.body.scrollHeight")
+            if new_height == last_height:
+                break
+            last_height = new_height
 
         return list(image_urls)[:num_images]
 
+    async def _fetch_image_urls(self, session, semaphore, query, num_images):
+        """
+        Fetch one results page over HTTP and parse the image URLs out of it.
+        Failed queries return an empty list.
+        """
+        import aiohttp
+
+        async with semaphore:
+            try:
+                async with session.get(
+                    self.search_url,
+                    params={"q": query, "form": "HDRSC2", "first": "1"},
+                    timeout=aiohttp.ClientTimeout(total=self.request_timeout),
+                ) as response:
+                    response.raise_for_status()
+                    page_html = await response.text()
+            except Exception as e:
+                print(f"Failed to search images for '{query}' -> {e}")
+                return []
+
+        return parse_bing_image_urls(page_html, num_images)
+
+    def _search_event_loop(self):
+        """Return the background event loop of the 'http' backend, starting it on first use."""
+        with self._search_lock:
+            if self._search_loop is None:
+                loop = asyncio.new_event_loop()
+                self._search_thread = threading.Thread(target=loop.run_forever, name="image-search", daemon=True)
+                self._search_thread.start()
+                self._search_loop = loop
+            return self._search_loop
+
+    async def _search_images_http(self, queries, num_images):
+        import aiohttp
+
+        # Created on the search loop, which is the only thread using them
+        if self._search_session is None:
+            self._search_semaphore = asyncio.Semaphore(max(1, self.max_concurrent_queries))
+            self._search_session = aiohttp.ClientSession(headers=HTTP_HEADERS)
+        return await asyncio.gather(*(
+            self._fetch_image_urls(self._search_session, self._search_semaphore, query, num_images)
+            for query in queries
+        ))
+
+    def search_images_http(self, queries, num_images=10):
+        """
+        Searches Bing Images for many queries concurrently without a browser.
+
+        :param queries: List of search queries (list)
+        :param num_images: Number of image links to collect per query (int)
+        :return: One list of image URLs per query, in the order of `queries` (list)
+        """
+        future = asyncio.run_coroutine_threadsafe(
+            self._search_images_http(list(queries), num_images), self._search_event_loop()
+        )
+        return list(future.result())
+
+    def download_image(self, url, file_path):
+        """
+        Streams one image to disk.
+
+        The response must have an image content type and stay below
+        `max_image_bytes`; otherwise nothing is written. The extension of
+        `file_path` is replaced with the one matching the content type.
+
+        :param url: Image URL (str)
+        :param file_path: Target path, extension optional (str)
+        :return: Path of the saved image
+        :raises ValueError: If the response is not an acceptable image
+        """
+        with self.session.get(url, timeout=self.request_timeout, stream=True) as response:
+            response.raise_for_status()
+
+            content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+            if content_type not in IMAGE_EXTENSIONS:
+                raise ValueError(f"Unsupported content type '{content_type}'")
+
+            content_length = response.headers.get("Content-Length")
+            if content_length and int(content_length) > self.max_image_bytes:
+                raise ValueError(f"Image too large ({content_length} bytes)")
+
+            file_path = os.path.splitext(file_path)[0] + IMAGE_EXTENSIONS[content_type]
+            tmp_path = file_path + ".part"
+            written = 0
+            try:
+                with open(tmp_path, "wb") as f:
+                    for chunk in response.iter_content(chunk_size=64 * 1024):
+                        written += len(chunk)
+                        if written > self.max_image_bytes:
+                            raise ValueError(f"Image exceeds {self.max_image_bytes} bytes")
+                        f.write(chunk)
+                if written == 0:
+                    raise ValueError("Empty response")
+                os.replace(tmp_path, file_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+        return file_path
+
+    def download_first_image(self, image_urls, file_path):
+        """
+        Tries the candidate URLs in order and keeps the first one that downloads.
+
+        :param image_urls: Candidate image URLs (list)
+        :param file_path: Target path, extension optional (str)
+        :return: Path of the saved image, or None if every candidate failed
+        """
+        for url in image_urls:
+            try:
+                return self.download_image(url, file_path)
+            except Exception as e:
+                print(f"Failed to download {url} -> {e}")
+        return None
+
     def download_images(self, image_urls, prefix=""):
         """
         Downloads images from a list of URLs into the specified save folder.
+        Up to `download_workers` downloads run in parallel.
 
         :param image_urls: List of image URLs (list)
         :param prefix: A string prefix to add to each filename (str)
         :return: List of file paths for the successfully downloaded images
         """
-        saved_paths = []
-
-        for idx, url in enumerate(image_urls):
+        def download(idx, url):
             # Incorporate prefix into file name so each is unique
-            file_name = f"{prefix}image_{idx}.jpg"
-            file_path = os.path.join(self.save_folder, file_name)
+            file_path = os.path.join(self.save_folder, f"{prefix}image_{idx}.jpg")
+            return self.download_first_image([url], file_path)
 
-            try:
-                response = requests.get(url, timeout=10)
-                response.raise_for_status()
-                with open(file_path, "wb") as f:
-                    f.write(response.content)
-                saved_paths.append(file_path)
-            except Exception as e:
-                print(f"Failed to download {url} -> {e}")
+        if not image_urls:
+            return []
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.download_workers, len(image_urls)))) as executor:
+            results = executor.map(download, range(len(image_urls)), image_urls)
 
-        return saved_paths
+        return [path for path in results if path]
 
-    def download_images_for_bing_prompts(self, prompts_list):
+    def download_images_for_bing_prompts(self, prompts_list, prefix=""):
         """
         Takes a list of Bing search prompts and downloads exactly one image for each prompt.
+        Prompts are processed in parallel. For every prompt `num_candidates` image URLs
+        are collected and the first one that downloads is kept. Prompts found in the
+        image cache are returned from it without searching.
         
         :param prompts_list: List of strings containing Bing search prompts
+        :param prefix: A string prefix to add to each filename (str)
         :return: List of paths to downloaded images
         """
-        all_downloaded_paths = []
+        cached = [self.cache.lookup(prompt) if self.cache is not None else None for prompt in prompts_list]
+        missing = [i for i, path in enumerate(cached) if path is None]
+        if self.cache is not None and len(missing) < len(prompts_list):
+            print(f"Image cache hit for {len(prompts_list) - len(missing)} of {len(prompts_list)} prompts")
+
+        found_per_prompt = [None] * len(prompts_list)
+        if self.backend == "http" and missing:
+            # All searches go out at once; only one round-trip per prompt
+            found = self.search_images_http([prompts_list[i] for i in missing], num_images=self.num_candidates)
+            for i, image_urls in zip(missing, found):
+                found_per_prompt[i] = image_urls
+        workers = self.download_workers if self.backend == "http" else self.pool_size
+
+        def download_for_prompt(i, prompt):
+            if cached[i] is not None:
+                return cached[i]
+
+            found_images = found_per_prompt[i]
+            if found_images is None:
+                found_images = self.scrape_bing_images(query=prompt, num_images=self.num_candidates, headless=True)
 
-        for i, prompt in enumerate(prompts_list):
-            # Scrape exactly 1 Bing image per prompt
-            found_images = self.scrape_bing_images(query=prompt, num_images=1, headless=True)
-            
             # Pass a unique prefix or index to avoid overwriting
-            downloaded = self.download_images(found_images, prefix=f"prompt_{i}_")
-            all_downloaded_paths.extend(downloaded)
+            file_path = os.path.join(self.save_folder, f"{prefix}prompt_{i}_image_0.jpg")
+            downloaded = self.download_first_image(found_images, file_path)
+            if downloaded and self.cache is not None:
+                # Keep the single deduplicated copy in the cache
+                stored = self.cache.store(prompt, downloaded)
+                os.remove(downloaded)
+                return stored
+            return downloaded
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            results = executor.map(download_for_prompt, range(len(prompts_list)), prompts_list)
 
-        return all_downloaded_paths
+        return [path for path in results if path]
@@ -0,0 +1,282 @@
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+
+from contextlib import contextmanager
+
+
+def peak_rss():
+    """
+    Return the peak resident set size of this process in bytes, or None where it is unavailable (Windows).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux kilobytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def current_rss():
+    """
+    Return the resident set size of this process in bytes.
+
+    Falls back to the lifetime peak where /proc is not available, and to None
+    where neither is (Windows).
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return peak_rss()
+
+
+def children_cpu_seconds():
+    """
+    Return the CPU time of all terminated child processes, or None where it is unavailable (Windows).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+# Held by the span being profiled; only one cProfile profiler can be active at a time
+# (Python 3.12+ raises ValueError for a second one, earlier versions silently replace it)
+_profiler_slot = threading.Lock()
+
+
+def _max_rss(*values):
+    """Largest of the RSS values that are known, None if none is."""
+    known = [value for value in values if value is not None]
+    return max(known) if known else None
+
+
+class Span:
+    def __init__(self, name, parent=None, **attrs):
+        """
+        Timing and resource record of one stage or sub-item.
+
+        :param parent: Name of the enclosing span, if any (str)
+        :param attrs: Extra fields exported with the span, e.g. index=3
+        """
+        self.name = name
+        self.parent = parent
+        self.attrs = attrs
+        self.items = 0
+        self.thread_id = threading.get_ident()
+        self.thread_name = threading.current_thread().name
+        self.start = None
+        self.wall_seconds = None
+        self.cpu_seconds = None
+        self.child_cpu_seconds = None
+        self.peak_rss = None
+        self.error = None
+
+    def add_items(self, count=1):
+        """Count processed items, e.g. sentences or images."""
+        self.items += count
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "parent": self.parent,
+            "thread": self.thread_name,
+            "start": self.start,
+            "wall_seconds": self.wall_seconds,
+            "cpu_seconds": self.cpu_seconds,
+            "child_cpu_seconds": self.child_cpu_seconds,
+            "peak_rss": self.peak_rss,
+            "items": self.items,
+            "error": self.error,
+            **self.attrs,
+        }
+
+
+class Tracer:
+    def __init__(self, name="pipeline", sample_interval=0.05, profile_stages=(), profile_dir="profiles"):
+        """
+        Records spans with wall time, CPU time, peak RSS and item counts.
+
+        CPU time is that of the thread running the span, since stages run concurrently
+        on scheduler threads. `child_cpu_seconds` is the CPU time of subprocesses
+        (ffmpeg, worker pools) that exited while the span was open. Peak RSS is the
+        process-wide maximum sampled while the span was open. Both are None where
+        the platform does not report them (Windows).
+
+        :param name: Name of the traced run, used in file names (str)
+        :param sample_interval: Seconds between RSS samples (float)
+        :param profile_stages: Span names to capture with cProfile. Only one span is profiled at a
+                               time; spans opened while another one is profiled are not (iterable)
+        :param profile_dir: Directory for the .prof files (str)
+        """
+        self.name = name
+        self.sample_interval = sample_interval
+        self.profile_stages = set(profile_stages)
+        self.profile_dir = profile_dir
+        self.spans = []
+        self._open = set()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._sampler = None
+        self._origin = time.time() - time.perf_counter()
+
+    def _sample(self):
+        """Background thread updating the peak RSS of all open spans."""
+        while True:
+            with self._lock:
+                if not self._open:
+                    self._sampler = None
+                    return
+                rss = current_rss()
+                for span in self._open:
+                    span.peak_rss = _max_rss(span.peak_rss, rss)
+            time.sleep(self.sample_interval)
+
+    @contextmanager
+    def span(self, name, items=0, **attrs):
+        """
+        Record the enclosed block as a span. Spans opened inside it on the same
+        thread are recorded as its children.
+
+        :param items: Number of items processed in the span, more can be added with span.add_items (int)
+        :return: The open Span
+        """
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+
+        span = Span(name, stack[-1].name if stack else None, **attrs)
+        span.add_items(items)
+        span.peak_rss = current_rss()
+
+        profiler = None
+        if name in self.profile_stages:
+            if _profiler_slot.acquire(blocking=False):
+                profiler = cProfile.Profile()
+            else:
+                # Nested in, or running alongside, a profiled span; its time shows up there
+                print(f"Not profiling '{name}': another span is being profiled")
+
+        with self._lock:
+            self._open.add(span)
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample, name="rss-sampler", daemon=True)
+                self._sampler.start()
+
+        stack.append(span)
+        children_before = children_cpu_seconds()
+        cpu_start = time.thread_time()
+        start = time.perf_counter()
+        span.start = self._origin + start
+        if profiler is not None:
+            try:
+                profiler.enable()
+            except ValueError as e:
+                # A profiler outside of the tracer is already active
+                print(f"Not profiling '{name}': {e}")
+                _profiler_slot.release()
+                profiler = None
+        try:
+            yield span
+        except BaseException as e:
+            span.error = repr(e)
+            raise
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                _profiler_slot.release()
+            span.wall_seconds = time.perf_counter() - start
+            span.cpu_seconds = time.thread_time() - cpu_start
+            children_after = children_cpu_seconds()
+            if children_before is not None and children_after is not None:
+                span.child_cpu_seconds = children_after - children_before
+            stack.pop()
+            with self._lock:
+                self._open.discard(span)
+                span.peak_rss = _max_rss(span.peak_rss, current_rss())
+                self.spans.append(span)
+            if profiler is not None:
+                os.makedirs(self.profile_dir, exist_ok=True)
+                profiler.dump_stats(os.path.join(self.profile_dir, f"{self.name}_{name}_{id(span)}.prof"))
+
+    def record(self, name, start, wall_seconds, items=0, **attrs):
+        """
+        Record a span that was timed outside of `span()`, e.g. one of several
+        requests running concurrently on an asyncio loop. Only its wall time is
+        known; it is recorded as a child of the span open on the calling thread.
+
+        :param start: time.perf_counter() when the work started (float)
+        :param wall_seconds: Duration of the work (float)
+        :return: The recorded Span
+        """
+        stack = getattr(self._local, "stack", None)
+        span = Span(name, stack[-1].name if stack else None, **attrs)
+        span.add_items(items)
+        span.start = self._origin + start
+        span.wall_seconds = wall_seconds
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    def reset(self):
+        """Drop the recorded spans, e.g. after exporting them."""
+        with self._lock:
+            self.spans = []
+
+    def summary(self):
+        """Return the total wall time, CPU time, peak RSS and items per span name."""
+        totals = {}
+        for span in self.spans:
+            total = totals.setdefault(
+                span.name, {"count": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0, "peak_rss": None, "items": 0}
+            )
+            total["count"] += 1
+            total["wall_seconds"] += span.wall_seconds
+            total["cpu_seconds"] += span.cpu_seconds or 0.0
+            total["peak_rss"] = _max_rss(total["peak_rss"], span.peak_rss)
+            total["items"] += span.items
+        return totals
+
+    def export_jsonl(self, path):
+        """Append one JSON line per span, so runs can be compared over time."""
+        with open(path, "a", encoding="utf-8") as f:
+            for span in self.spans:
+                f.write(json.dumps({"trace": self.name, **span.to_dict()}) + "\n")
+        return path
+
+    def export_chrome_trace(self, path):
+        """
+        Write the spans in the Chrome trace event format, viewable in chrome://tracing or Perfetto.
+        """
+        pid = os.getpid()
+        events = []
+        threads = {}
+        for span in self.spans:
+            threads[span.thread_id] = span.thread_name
+            events.append({
+                "name": span.name,
+                "cat": span.parent or "stage",
+                "ph": "X",
+                "ts": span.start * 1e6,
+                "dur": span.wall_seconds * 1e6,
+                "pid": pid,
+                "tid": span.thread_id,
+                "args": {
+                    key: value for key, value in span.to_dict().items()
+                    if key not in ("name", "start", "wall_seconds", "thread")
+                },
+            })
+        for thread_id, thread_name in threads.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": thread_id,
+                           "args": {"name": thread_name}})
+
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        return path
@@ -0,0 +1,137 @@
+import json
+import os
+import sqlite3
+import time
+
+from contextlib import contextmanager
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobQueue:
+    def __init__(self, db_path="jobs/jobs.sqlite3"):
+        """
+        Persistent queue of reel jobs shared by the Streamlit app and the worker processes.
+
+        :param db_path: Path of the SQLite database holding the jobs (str)
+        """
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._connect() as db:
+            # WAL lets the UI read job status while workers write progress
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, video_url TEXT NOT NULL, "
+                "options TEXT NOT NULL, status TEXT NOT NULL, stage TEXT, "
+                "progress REAL NOT NULL DEFAULT 0, result_path TEXT, error TEXT, worker TEXT, "
+                "created REAL NOT NULL, started REAL, finished REAL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id)")
+
+    @contextmanager
+    def _connect(self):
+        """Open the database, commit on success and always close the connection."""
+        db = sqlite3.connect(self.db_path, timeout=30)
+        db.row_factory = sqlite3.Row
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    @staticmethod
+    def _to_dict(row):
+        job = dict(row)
+        job["options"] = json.loads(job["options"])
+        return job
+
+    def submit(self, video_url, **options):
+        """
+        Add a job for `video_url`. `options` are passed to the worker, e.g. draft=True.
+
+        :return: ID of the new job (int)
+        """
+        with self._connect() as db:
+            cursor = db.execute(
+                "INSERT INTO jobs (video_url, options, status, created) VALUES (?, ?, ?, ?)",
+                (video_url, json.dumps(options), QUEUED, time.time()),
+            )
+            return cursor.lastrowid
+
+    def claim(self, worker):
+        """
+        Atomically take the oldest queued job for `worker`.
+
+        :return: The job as a dict, or None if the queue is empty
+        """
+        with self._connect() as db:
+            # A single UPDATE is atomic, so two workers never claim the same job
+            claimed = db.execute(
+                "UPDATE jobs SET status = ?, worker = ?, started = ?, stage = NULL, progress = 0 "
+                "WHERE id = (SELECT id FROM jobs WHERE status = ? ORDER BY id LIMIT 1)",
+                (RUNNING, worker, time.time(), QUEUED),
+            ).rowcount
+            if not claimed:
+                return None
+            row = db.execute(
+                "SELECT * FROM jobs WHERE status = ? AND worker = ? ORDER BY started DESC LIMIT 1",
+                (RUNNING, worker),
+            ).fetchone()
+        return self._to_dict(row)
+
+    def update_progress(self, job_id, stage, progress):
+        with self._connect() as db:
+            db.execute("UPDATE jobs SET stage = ?, progress = ? WHERE id = ?", (stage, progress, job_id))
+
+    def complete(self, job_id, result_path):
+        with self._connect() as db:
+            db.execute(
+                "UPDATE jobs SET status = ?, progress = 1, result_path = ?, finished = ? WHERE id = ?",
+                (DONE, result_path, time.time(), job_id),
+            )
+
+    def fail(self, job_id, error):
+        with self._connect() as db:
+            db.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished = ? WHERE id = ?",
+                (FAILED, error, time.time(), job_id),
+            )
+
+    def requeue_running(self, worker=None):
+        """
+        Put jobs interrupted by a stopped worker back into the queue.
+
+        :param worker: Only requeue the jobs of this worker, or all running jobs if None
+        :return: Number of requeued jobs
+        """
+        query = "UPDATE jobs SET status = ?, worker = NULL, stage = NULL, progress = 0 WHERE status = ?"
+        params = [QUEUED, RUNNING]
+        if worker is not None:
+            query += " AND worker = ?"
+            params.append(worker)
+        with self._connect() as db:
+            return db.execute(query, params).rowcount
+
+    def get(self, job_id):
+        with self._connect() as db:
+            row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return None if row is None else self._to_dict(row)
+
+    def list_jobs(self, limit=50):
+        """Return the most recent jobs, newest first."""
+        with self._connect() as db:
+            rows = db.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def counts(self):
+        """Return the number of jobs per status."""
+        with self._connect() as db:
+            rows = db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
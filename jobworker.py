@@ -0,0 +1,152 @@
+"""
+Worker service that processes the reel jobs submitted through the Streamlit app.
+
+Every worker process loads the models once and keeps them warm across jobs, so
+concurrent users queue up for a fixed number of workers instead of each
+loading their own copy of the models.
+
+Usage:
+    python jobworker.py [--workers 2] [--db jobs/jobs.sqlite3]
+"""
+import argparse
+import multiprocessing
+import os
+import time
+
+from jobqueue import JobQueue
+
+
+def warm_up(whisper_model="base", whisper_workers=1):
+    """Load the models used by the pipeline into this process's registry."""
+    from modelregistry import registry
+    from ytdownloader import whisper_pool
+
+    start = time.perf_counter()
+    registry.get_llamarizer(use_cuda=False)
+    registry.get_whisper(whisper_model)
+    if whisper_workers > 1:
+        whisper_pool(whisper_model, whisper_workers)
+    print(f"[{os.getpid()}] Models loaded in {time.perf_counter() - start:.1f}s")
+
+
+def process_job(queue, job, whisper_model="base", whisper_workers=1):
+    """Run the pipeline for one claimed job and record its outcome in the queue."""
+    from appworkflow import Engine
+
+    options = dict(job["options"])
+    draft = options.pop("draft", False)
+    options.setdefault("whisper_model", whisper_model)
+    # The worker's Whisper pool, sized so all workers together use each core once
+    options.setdefault("whisper_workers", whisper_workers)
+
+    def on_progress(stage, state, fraction):
+        queue.update_progress(job["id"], f"{stage} {state}", fraction)
+
+    try:
+        engine = Engine(job["video_url"], progress_callback=on_progress, **options)
+        if engine.process_video(draft=draft):
+            queue.complete(job["id"], engine.video_path)
+        else:
+            queue.fail(job["id"], engine.error or "Video processing failed")
+    except Exception as e:
+        queue.fail(job["id"], str(e))
+
+
+def run_worker(db_path, worker_name, poll_interval=2.0, whisper_model="base", whisper_workers=1):
+    """
+    Claim and process jobs until the process is terminated.
+
+    :param poll_interval: Seconds to wait before checking an empty queue again (float)
+    :param whisper_workers: Size of this worker's Whisper pool, kept for all its jobs (int)
+    """
+    queue = JobQueue(db_path)
+    warm_up(whisper_model, whisper_workers)
+
+    while True:
+        job = queue.claim(worker_name)
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+
+        print(f"[{worker_name}] Processing job {job['id']}: {job['video_url']}")
+        start = time.perf_counter()
+        process_job(queue, job, whisper_model, whisper_workers)
+        print(f"[{worker_name}] Job {job['id']} finished in {time.perf_counter() - start:.1f}s")
+
+
+class WorkerService:
+    def __init__(self, num_workers=2, db_path="jobs/jobs.sqlite3", poll_interval=2.0, whisper_model="base"):
+        """
+        Pool of worker processes consuming the job queue.
+
+        :param num_workers: Number of jobs processed at once; every worker holds its own models (int)
+        :param db_path: Path of the job database (str)
+        :param poll_interval: Seconds between polls of an empty queue (float)
+        :param whisper_model: Whisper model size kept loaded in the workers (str)
+        """
+        self.num_workers = num_workers
+        self.db_path = db_path
+        self.poll_interval = poll_interval
+        self.whisper_model = whisper_model
+        # Every worker keeps its own Whisper pool; together they use each core once
+        self.whisper_workers = max(1, (os.cpu_count() or 1) // num_workers)
+        self.processes = []
+
+    def start(self):
+        # Jobs left running by a previous service were interrupted
+        requeued = JobQueue(self.db_path).requeue_running()
+        if requeued:
+            print(f"Requeued {requeued} interrupted jobs")
+
+        self.processes = [self._spawn(f"worker-{i}") for i in range(self.num_workers)]
+        print(f"Started {self.num_workers} workers")
+
+    def _spawn(self, name):
+        # Spawned workers start without the parent's threads and torch state
+        process = multiprocessing.get_context("spawn").Process(
+            target=run_worker,
+            args=(self.db_path, name, self.poll_interval, self.whisper_model, self.whisper_workers),
+            name=f"reelwise-{name}",
+        )
+        process.start()
+        return process
+
+    def stop(self):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.join()
+        self.processes = []
+        JobQueue(self.db_path).requeue_running()
+
+    def serve_forever(self):
+        """Start the workers and restart any that die until interrupted."""
+        self.start()
+        try:
+            while True:
+                time.sleep(5)
+                for i, process in enumerate(self.processes):
+                    if not process.is_alive():
+                        name = f"worker-{i}"
+                        print(f"{name} exited with code {process.exitcode}, restarting")
+                        JobQueue(self.db_path).requeue_running(name)
+                        self.processes[i] = self._spawn(name)
+        except KeyboardInterrupt:
+            print("Stopping workers...")
+        finally:
+            self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Process queued Reelwise jobs.")
+    parser.add_argument("--workers", type=int, default=2, help="Number of worker processes")
+    parser.add_argument("--db", default="jobs/jobs.sqlite3", help="Path of the job database")
+    parser.add_argument("--poll-interval", type=float, default=2.0, help="Seconds between queue polls")
+    parser.add_argument("--whisper-model", default="base", help="Whisper model kept loaded in the workers")
+    args = parser.parse_args()
+
+    WorkerService(args.workers, args.db, args.poll_interval, args.whisper_model).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -7,9 +7,11 @@
 #!pip install transformers bitsandbytes accelerate
 
 import torch
+import copy
 import json
 import time
 import re
+import threading
 
 from transformers import (
     AutoModelForCausalLM,
@@ -27,16 +29,101 @@ from peft import (
     get_peft_model,
 )
 
+# Upper bound on the length of one chunk summary
+SUMMARY_MAX_NEW_TOKENS = 200
+
+# System prompts of the LLM stages; the pipeline hashes them into its cache keys
+SCRIPT_SYSTEM_PROMPT = (
+    "You're an expert video script writer specializing in educational content. Your task is to "
+    "create engaging and concise text scripts for Instagram Reels that explain complex topics "
+    "in a simple, clear manner. The user will provide a transcript of an educational lecture or "
+    "material. Be aware that the transcript is imperfect, there will be mistakes in it. From this transcript, you will extract the key concepts and create one short, "
+    "engaging script. The script should be written with an educational tone, conversational style, "
+    "and suitable for a short video. It must end in a complete sentence, ensuring there are no "
+    "unfinished or incomplete thoughts. Your output must be only the script as a single string - "
+    "no JSON, no commentary, and no additional formatting. Do not include any timestamps, it should "
+    "be in the style of a transcript, ready to be read by one narrator. You ONLY produce text that "
+    "will be read by a voice actor for a video. The user will give you the description of the video "
+    "they want you to make and from that, you will write the script. Make sure to directly write "
+    "the script in response to the lecture transcript provided by the user. Only include the text that will be narrated by the "
+    "voice actor. You will produce purely text, with no other textual elements than the script itself."
+    "Keep your answer concise and short, with a maximum of 100 words."
+)
+
+CHUNK_SUMMARY_SYSTEM_PROMPT = (
+    "You are an expert note taker for educational content. The user will provide one part of "
+    "the transcript of a longer lecture. Be aware that the transcript is imperfect, there will be "
+    "mistakes in it. Summarize the key concepts, definitions and examples of this part in plain "
+    "sentences. Do not add commentary or formatting. Keep your answer short, with a maximum of 80 words."
+)
+
+SEARCH_TERM_SYSTEM_PROMPT = (
+    "You are a creative social media content planner. You specialize in selecting relevant images "
+    "to accompany short educational video reels on Instagram. You will receive exactly one sentence of a reel script. "
+    "Your task: for this sentence from the script, produce ONE Bing image search term to find a fitting image. "
+    "This search term should be concise, direct, and capture the core idea or metaphor "
+    "of each sentence, suitable for an Instagram educational reel."
+    "It should help the viewer understand the concept mentioned in the sentence."
+    "Return only the search term, in exactly the format that can be pasted into the Bing search bar."
+    "No extra commentary, no explanation, just the Bing search term."
+)
+
+
+def process_script(script):
+    """
+    Takes a string input:
+    1) If there is a colon in the first sentence, remove everything up to and including that colon.
+    2) Split the remaining text into a list of sentences.
+    """
+    # First check for colon in the text before first period/question mark/exclamation
+    first_sentence_end = re.search(r'[.?!]', script)
+    if first_sentence_end:
+        first_part = script[:first_sentence_end.start()]
+        rest = script[first_sentence_end.start():]
+    else:
+        first_part = script
+        rest = ""
+        
+    # If first part contains colon, remove everything before it
+    if ':' in first_part:
+        _, after_colon = first_part.split(':', 1)
+        script = after_colon.strip() + rest
+        
+    # Split into sentences, keeping the punctuation
+    sentences = [sent.strip() for sent in re.findall(r'[^.!?]+[.!?]', script)]
+    
+    return sentences
+
+
 class LLaMarizer:
-    def __init__(self, use_cuda=False):
+    def __init__(self, use_cuda=False, inference_only=False, adapter_path=None, quantize_cpu=False,
+                 use_prefix_cache=True):
         """
         Initialize configuration, model, tokenizer, and any other essentials.
         The `use_cuda` parameter decides whether to run on CPU or GPU.
+
+        With `inference_only` the model is not wrapped for LoRA training. A
+        trained adapter given by `adapter_path` is merged into the base weights
+        instead, and `quantize_cpu` applies dynamic int8 quantization to the
+        linear layers when running on CPU.
+
+        With `use_prefix_cache` the key/value cache of each fixed system prompt
+        is computed once and reused, so only the user turn is prefilled per call
+        and per batch row.
+
+        One instance can be shared by several threads. Generation calls are
+        serialized, since they switch the tokenizer's padding side and fill
+        the shared prefix caches.
         """
         # This helps reduce memory usage and speeds up computations, especially on GPUs.
         # "Eager" mode means that operations are executed immediately as they are called.
         self.attn_implementation = "eager"
         self.auth_token = ""
+        self.inference_only = inference_only
+        self._pipeline = None
+        self.use_prefix_cache = use_prefix_cache
+        self._prefix_caches = {}
+        self._generate_lock = threading.RLock()
         
         if use_cuda:
             self.device_map = "auto"
@@ -77,6 +164,10 @@ class LLaMarizer:
         )
         self.tokenizer.pad_token = self.tokenizer.eos_token
 
+        if inference_only:
+            self._prepare_for_inference(use_cuda, adapter_path, quantize_cpu)
+            return
+
         # LoRA config
         self.peft_config = LoraConfig(
             r=16,
@@ -90,44 +181,117 @@ class LLaMarizer:
         # Apply LoRA to the Model
         self.model = get_peft_model(self.model, self.peft_config)
 
+    def _prepare_for_inference(self, use_cuda, adapter_path, quantize_cpu):
+        """
+        Get the plain model ready for generation only.
+        """
+        if adapter_path:
+            # Fold the adapter into the base weights so no LoRA layers run at inference time
+            self.model = PeftModel.from_pretrained(self.model, adapter_path).merge_and_unload()
+
+        self.model.eval()
+
+        if quantize_cpu and not use_cuda:
+            self.model = torch.quantization.quantize_dynamic(
+                self.model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+
     def _create_pipeline(self):
         """
-        Create a text-generation pipeline with the configured model and tokenizer.
+        Return the text-generation pipeline with the configured model and tokenizer.
+        The pipeline is built on first use and reused afterwards.
         """
-        return pipeline(
-            "text-generation",
-            model=self.model,
-            tokenizer=self.tokenizer,
-            torch_dtype=self.torch_dtype,
-            device_map=self.device_map,
-        )
+        if self._pipeline is None:
+            self._pipeline = pipeline(
+                "text-generation",
+                model=self.model,
+                tokenizer=self.tokenizer,
+                torch_dtype=self.torch_dtype,
+                device_map=self.device_map,
+            )
+        return self._pipeline
 
-    def generate_script(self, transcript):
+    def _prefix_cache(self, system_message, input_ids):
         """
-        Generate a short educational video script (JSON format) from the given transcript.
-        Returns the full pipeline output.
+        Return the key/value cache for the tokens of `system_message`, or None
+        if the chat template does not render the system turn as a prefix of
+        `input_ids`.
+
+        The cache is computed once per system message and recomputed only if
+        the rendered prefix changes (the Llama template embeds today's date).
         """
-        pipe = self._create_pipeline()
+        entry = self._prefix_caches.get(system_message)
+        if entry is None:
+            prefix_ids = self.tokenizer.apply_chat_template(
+                [{"role": "system", "content": system_message}],
+                tokenize=True,
+                return_dict=True,
+                return_tensors="pt",
+            )["input_ids"].to(self.model.device)
+        else:
+            prefix_ids = entry[0]
+
+        prefix_len = prefix_ids.shape[1]
+        if prefix_len >= input_ids.shape[1] or not torch.equal(input_ids[:, :prefix_len], prefix_ids):
+            if entry is None:
+                return None
+            # Template output changed, rebuild the prefix from scratch
+            self._prefix_caches.pop(system_message, None)
+            return self._prefix_cache(system_message, input_ids)
+
+        if entry is None:
+            with torch.inference_mode():
+                cache = self.model(prefix_ids, use_cache=True).past_key_values
+            entry = (prefix_ids, cache)
+            self._prefix_caches[system_message] = entry
+
+        return entry[1]
 
-        messages_script = [
+    def _generate_chat(self, messages, max_new_tokens=512, do_sample=True):
+        """
+        Generate the assistant reply to `messages`.
+
+        Returns the same structure as the text-generation pipeline:
+        [{"generated_text": messages + [{"role": "assistant", "content": ...}]}].
+        """
+        with self._generate_lock:
+            if not self.use_prefix_cache or messages[0]["role"] != "system":
+                pipe = self._create_pipeline()
+                with torch.inference_mode():
+                    return pipe(messages, max_new_tokens=max_new_tokens, do_sample=do_sample)
+
+            input_ids = self.tokenizer.apply_chat_template(
+                messages,
+                tokenize=True,
+                add_generation_prompt=True,
+                return_dict=True,
+                return_tensors="pt",
+            )["input_ids"].to(self.model.device)
+            prefix_cache = self._prefix_cache(messages[0]["content"], input_ids)
+
+            with torch.inference_mode():
+                # generate() extends the cache in place, so every call works on its own copy
+                past_key_values = copy.deepcopy(prefix_cache) if prefix_cache is not None else None
+                outputs = self.model.generate(
+                    input_ids=input_ids,
+                    attention_mask=torch.ones_like(input_ids),
+                    past_key_values=past_key_values,
+                    max_new_tokens=max_new_tokens,
+                    do_sample=do_sample,
+                    pad_token_id=self.tokenizer.pad_token_id,
+                )
+
+            reply = self.tokenizer.decode(outputs[0, input_ids.shape[1]:], skip_special_tokens=True)
+            return [{"generated_text": messages + [{"role": "assistant", "content": reply.strip()}]}]
+
+    def _script_messages(self, transcript):
+        """
+        Build the chat messages asking for a reel script from a transcript.
+        """
+        return [
             {
                 "role": "system",
-                "content": (
-                    "You're an expert video script writer specializing in educational content. Your task is to "
-                    "create engaging and concise text scripts for Instagram Reels that explain complex topics "
-                    "in a simple, clear manner. The user will provide a transcript of an educational lecture or "
-                    "material. Be aware that the transcript is imperfect, there will be mistakes in it. From this transcript, you will extract the key concepts and create one short, "
-                    "engaging script. The script should be written with an educational tone, conversational style, "
-                    "and suitable for a short video. It must end in a complete sentence, ensuring there are no "
-                    "unfinished or incomplete thoughts. Your output must be only the script as a single string - "
-                    "no JSON, no commentary, and no additional formatting. Do not include any timestamps, it should "
-                    "be in the style of a transcript, ready to be read by one narrator. You ONLY produce text that "
-                    "will be read by a voice actor for a video. The user will give you the description of the video "
-                    "they want you to make and from that, you will write the script. Make sure to directly write "
-                    "the script in response to the lecture transcript provided by the user. Only include the text that will be narrated by the "
-                    "voice actor. You will produce purely text, with no other textual elements than the script itself."
-                    "Keep your answer concise and short, with a maximum of 100 words."
-                ),
+                "content": SCRIPT_SYSTEM_PROMPT,
             },
             {
                 "role": "user",
@@ -135,37 +299,121 @@ class LLaMarizer:
             },
         ]
 
-        outputs_script = pipe(
-            messages_script,
-            max_new_tokens=512,
-            do_sample=True
-        )
+    def _chunk_summary_messages(self, chunk):
+        """
+        Build the chat messages asking for a summary of one part of a transcript.
+        """
+        return [
+            {
+                "role": "system",
+                "content": CHUNK_SUMMARY_SYSTEM_PROMPT,
+            },
+            {
+                "role": "user",
+                "content": f"Here is the part of the lecture transcript: [{chunk}]",
+            },
+        ]
 
-        return outputs_script
-    
-    def generate_bing_search_term(self, script_text):
+    def _split_transcript(self, transcript, chunk_tokens):
         """
-        Given a string representing the script, create Bing-ready search terms 
-        for images that would fit each sentence of the script.
+        Split a transcript into chunks of at most `chunk_tokens` tokens, cutting
+        at sentence ends where possible.
+        """
+        chunks = []
+        current = []
+        current_tokens = 0
 
-        Returns a single string which should be a strictly valid JSON array
-        of search terms, e.g.: ["search prompt 1", "search prompt 2"].
+        for sentence in re.split(r'(?<=[.!?])\s+', transcript.strip()):
+            token_ids = self.tokenizer.encode(sentence, add_special_tokens=False)
+
+            # A single run-on sentence longer than the budget is cut by tokens
+            if len(token_ids) > chunk_tokens:
+                if current:
+                    chunks.append(" ".join(current))
+                    current, current_tokens = [], 0
+                for start in range(0, len(token_ids), chunk_tokens):
+                    chunks.append(self.tokenizer.decode(token_ids[start:start + chunk_tokens]))
+                continue
+
+            if current_tokens + len(token_ids) > chunk_tokens:
+                chunks.append(" ".join(current))
+                current, current_tokens = [], 0
+            current.append(sentence)
+            current_tokens += len(token_ids)
+
+        if current:
+            chunks.append(" ".join(current))
+        return chunks
+
+    def summarize_transcript(self, transcript, max_transcript_tokens=2048, chunk_tokens=1024, batch_size=4,
+                             max_rounds=3):
         """
-        pipe = self._create_pipeline()
+        Condense a long transcript until it fits into `max_transcript_tokens`.
 
-        messages_prompts = [
+        Map step: the transcript is split into chunks of `chunk_tokens` tokens and
+        every chunk is summarized, `batch_size` chunks per `generate` call. The
+        summaries are joined and, for very long sources, summarized again.
+
+        Summaries can be as long as small chunks, so a round may not shrink the
+        text. After a round without progress, or after `max_rounds` rounds, the
+        text is truncated to `max_transcript_tokens` instead.
+        """
+        token_count = len(self.tokenizer.encode(transcript, add_special_tokens=False))
+        rounds = 0
+        while token_count > max_transcript_tokens:
+            if rounds == max_rounds:
+                print(f"Transcript still {token_count} tokens after {rounds} rounds, truncating")
+                return self._truncate_tokens(transcript, max_transcript_tokens)
+
+            chunks = self._split_transcript(transcript, chunk_tokens)
+            print(f"Summarizing transcript in {len(chunks)} chunks...")
+
+            summaries = []
+            for start in range(0, len(chunks), batch_size):
+                batch = chunks[start:start + batch_size]
+                summaries.extend(self._generate_batch(
+                    [self._chunk_summary_messages(chunk) for chunk in batch],
+                    max_new_tokens=SUMMARY_MAX_NEW_TOKENS,
+                ))
+            summary = " ".join(summaries)
+            rounds += 1
+
+            summary_count = len(self.tokenizer.encode(summary, add_special_tokens=False))
+            if summary_count >= token_count:
+                print(f"Summarizing did not shorten the transcript ({summary_count} tokens), truncating")
+                return self._truncate_tokens(transcript, max_transcript_tokens)
+            transcript, token_count = summary, summary_count
+
+        return transcript
+
+    def _truncate_tokens(self, text, max_tokens):
+        """Cut `text` to its first `max_tokens` tokens."""
+        token_ids = self.tokenizer.encode(text, add_special_tokens=False)
+        return self.tokenizer.decode(token_ids[:max_tokens])
+
+    def generate_script(self, transcript, max_transcript_tokens=2048, chunk_tokens=1024, batch_size=4):
+        """
+        Generate a short educational video script (JSON format) from the given transcript.
+        Returns the full pipeline output.
+
+        Transcripts longer than `max_transcript_tokens` are first condensed with
+        `summarize_transcript` (map), then the script is written from the
+        summaries (reduce), so prompt length stays bounded for long videos.
+        """
+        transcript = self.summarize_transcript(transcript, max_transcript_tokens, chunk_tokens, batch_size)
+
+        messages_script = self._script_messages(transcript)
+
+        return self._generate_chat(messages_script, max_new_tokens=512, do_sample=True)
+
+    def _search_term_messages(self, script_text):
+        """
+        Build the chat messages asking for a Bing search term for one sentence.
+        """
+        return [
             {
                 "role": "system",
-                "content": (
-                    "You are a creative social media content planner. You specialize in selecting relevant images "
-                    "to accompany short educational video reels on Instagram. You will receive exactly one sentence of a reel script. "
-                    "Your task: for this sentence from the script, produce ONE Bing image search term to find a fitting image. "
-                    "This search term should be concise, direct, and capture the core idea or metaphor "
-                    "of each sentence, suitable for an Instagram educational reel."
-                    "It should help the viewer understand the concept mentioned in the sentence."
-                    "Return only the search term, in exactly the format that can be pasted into the Bing search bar."
-                    "No extra commentary, no explanation, just the Bing search term."
-                ),
+                "content": SEARCH_TERM_SYSTEM_PROMPT,
             },
             {
                 "role": "user",
@@ -176,11 +424,17 @@ class LLaMarizer:
             },
         ]
 
-        outputs_prompts = pipe(
-            messages_prompts,
-            max_new_tokens=512,
-            do_sample=True
-        )
+    def generate_bing_search_term(self, script_text):
+        """
+        Given a string representing the script, create Bing-ready search terms 
+        for images that would fit each sentence of the script.
+
+        Returns a single string which should be a strictly valid JSON array
+        of search terms, e.g.: ["search prompt 1", "search prompt 2"].
+        """
+        messages_prompts = self._search_term_messages(script_text)
+
+        outputs_prompts = self._generate_chat(messages_prompts, max_new_tokens=512, do_sample=True)
 
         # The pipeline's default return is a list of dicts with the key "generated_text"
         # e.g., [{"generated_text": "..."}].
@@ -189,16 +443,132 @@ class LLaMarizer:
 
         # Return just the single string
         return raw_response
-    
-    def generate_multiple_bing_search_terms(self, sentences):
+
+    def _expand_cache(self, cache, batch_size):
         """
-        Takes a list of sentences, calls `generate_bing_search_term` on each,
-        and returns a list of strings containing the Bing search terms.
+        Copy a key/value cache of one row and repeat it `batch_size` times along the batch dimension.
         """
+        cache = copy.deepcopy(cache)
+        if hasattr(cache, "batch_repeat_interleave"):
+            cache.batch_repeat_interleave(batch_size)
+            return cache
+        # Legacy tuple format: one (key, value) pair per layer
+        return tuple(
+            tuple(tensor.repeat(batch_size, *[1] * (tensor.dim() - 1)) for tensor in layer)
+            for layer in cache
+        )
+
+    def _prefixed_batch(self, messages_list):
+        """
+        Build the inputs of a batch on top of the cached key/values of its system prompt.
+
+        Every row is laid out as [system prefix][padding][rest of the prompt]. The
+        prefix cache is repeated along the batch dimension, only the rest is padded,
+        and the padding is masked out, so `generate` derives the positions of the
+        remaining tokens from the attention mask as if there were no gap.
+        Returns None if the prompts do not share one cacheable system prompt.
+        """
+        system_messages = {messages[0]["content"] for messages in messages_list}
+        if len(system_messages) != 1 or any(messages[0]["role"] != "system" for messages in messages_list):
+            return None
+
+        rows = [
+            self.tokenizer.apply_chat_template(
+                messages, tokenize=True, add_generation_prompt=True, return_dict=True,
+            )["input_ids"]
+            for messages in messages_list
+        ]
+        system_message = system_messages.pop()
+        prefix_cache = self._prefix_cache(system_message, torch.tensor([rows[0]], device=self.model.device))
+        if prefix_cache is None:
+            return None
+
+        prefix_ids = self._prefix_caches[system_message][0][0].tolist()
+        prefix_len = len(prefix_ids)
+        if any(len(row) <= prefix_len or row[:prefix_len] != prefix_ids for row in rows):
+            return None
+
+        suffixes = [row[prefix_len:] for row in rows]
+        width = max(len(suffix) for suffix in suffixes)
+        pad_id = self.tokenizer.pad_token_id
+        input_ids = [prefix_ids + [pad_id] * (width - len(suffix)) + suffix for suffix in suffixes]
+        attention_mask = [[1] * prefix_len + [0] * (width - len(suffix)) + [1] * len(suffix) for suffix in suffixes]
+        return {
+            "input_ids": torch.tensor(input_ids, device=self.model.device),
+            "attention_mask": torch.tensor(attention_mask, device=self.model.device),
+            "past_key_values": self._expand_cache(prefix_cache, len(rows)),
+        }
+
+    def _padded_batch(self, messages_list):
+        """
+        Build the inputs of a batch by left-padding the full prompts.
+        """
+        prompts = [
+            self.tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+            for messages in messages_list
+        ]
+
+        # Decoder-only models need left padding for batched generation
+        padding_side = self.tokenizer.padding_side
+        self.tokenizer.padding_side = "left"
+        try:
+            return self.tokenizer(
+                prompts,
+                return_tensors="pt",
+                padding=True,
+                add_special_tokens=False,
+            ).to(self.model.device)
+        finally:
+            self.tokenizer.padding_side = padding_side
+
+    def _generate_batch(self, messages_list, max_new_tokens=512, do_sample=True):
+        """
+        Run several chat prompts through a single `generate` call.
+
+        The prompts are padded into one batch so every row ends at the same
+        position and generation continues from there for all of them. With
+        `use_prefix_cache` the shared system prompt is taken from the prefix
+        cache and only the user turns are prefilled.
+        Returns the generated assistant text for each prompt, in input order.
+        """
+        with self._generate_lock:
+            inputs = self._prefixed_batch(messages_list) if self.use_prefix_cache else None
+            if inputs is None:
+                inputs = self._padded_batch(messages_list)
+
+            with torch.inference_mode():
+                outputs = self.model.generate(
+                    **inputs,
+                    max_new_tokens=max_new_tokens,
+                    do_sample=do_sample,
+                    pad_token_id=self.tokenizer.pad_token_id,
+                )
+
+            # Only decode the newly generated tokens of every row
+            new_tokens = outputs[:, inputs["input_ids"].shape[1]:]
+            return [
+                text.strip()
+                for text in self.tokenizer.batch_decode(new_tokens, skip_special_tokens=True)
+            ]
+
+    def generate_multiple_bing_search_terms(self, sentences, batch_size=8):
+        """
+        Takes a list of sentences and returns a list of strings containing the
+        Bing search terms, in the same order.
+
+        Sentences are processed `batch_size` at a time with one `generate` call
+        per batch. A `batch_size` of 1 calls `generate_bing_search_term` on each
+        sentence instead.
+        """
+        if batch_size <= 1:
+            return [self.generate_bing_search_term(sentence) for sentence in sentences]
+
         results = []
-        for sentence in sentences:
-            search_term = self.generate_bing_search_term(sentence)
-            results.append(search_term)
+        for start in range(0, len(sentences), batch_size):
+            batch = sentences[start:start + batch_size]
+            results.extend(self._generate_batch(
+                [self._search_term_messages(sentence) for sentence in batch]
+            ))
         return results
 
     def is_valid_format(self, response):
@@ -225,27 +595,6 @@ class LLaMarizer:
         raise ValueError("Failed to generate a valid script after multiple attempts")
     
     def process_script(self, script):
-        """
-        Takes a string input:
-        1) If there is a colon in the first sentence, remove everything up to and including that colon.
-        2) Split the remaining text into a list of sentences.
-        """
-        # First check for colon in the text before first period/question mark/exclamation
-        first_sentence_end = re.search(r'[.?!]', script)
-        if first_sentence_end:
-            first_part = script[:first_sentence_end.start()]
-            rest = script[first_sentence_end.start():]
-        else:
-            first_part = script
-            rest = ""
-            
-        # If first part contains colon, remove everything before it
-        if ':' in first_part:
-            _, after_colon = first_part.split(':', 1)
-            script = after_colon.strip() + rest
-            
-        # Split into sentences, keeping the punctuation
-        sentences = [sent.strip() for sent in re.findall(r'[^.!?]+[.!?]', script)]
-        
-        return sentences
+        """Split a script into sentences, see the module-level `process_script`."""
+        return process_script(script)
 
@@ -0,0 +1,207 @@
+import queue
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import wave
+
+
+def ffmpeg_executable():
+    """
+    Return the ffmpeg binary to use: the one bundled with imageio-ffmpeg
+    (installed alongside moviepy) or the one on PATH.
+    """
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        path = shutil.which("ffmpeg")
+        if path is None:
+            raise RuntimeError("ffmpeg was not found. Install imageio-ffmpeg or add ffmpeg to PATH.")
+        return path
+
+
+def run_ffmpeg(args):
+    """
+    Run ffmpeg with the given arguments, quietly and overwriting outputs.
+
+    :raises RuntimeError: With ffmpeg's error output if it fails
+    """
+    command = [ffmpeg_executable(), "-hide_banner", "-loglevel", "error", "-y", *args]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {result.stderr.strip()}")
+    return result
+
+
+def cut_audio(src_path, dst_path, start, end=None):
+    """
+    Cut the range [start, end) seconds out of an audio file and save it as 16-bit PCM.
+
+    :param end: End of the range in seconds, or None for the end of the file
+    """
+    args = ["-i", src_path, "-ss", f"{start:.3f}"]
+    if end is not None:
+        args += ["-to", f"{end:.3f}"]
+    run_ffmpeg(args + ["-vn", "-c:a", "pcm_s16le", dst_path])
+    return dst_path
+
+
+def media_duration(path):
+    """
+    Return the duration of a media file in seconds, as reported by its container.
+    """
+    command = [ffmpeg_executable(), "-hide_banner", "-i", path]
+    # Without an output ffmpeg exits with an error, but prints the input info first
+    result = subprocess.run(command, capture_output=True, text=True)
+    match = re.search(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)", result.stderr)
+    if not match:
+        raise RuntimeError(f"Could not determine duration of {path}")
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def decode_pcm(path, sample_rate=44100, channels=1):
+    """
+    Decode any audio file to raw 16-bit little-endian PCM bytes.
+    """
+    command = [
+        ffmpeg_executable(), "-hide_banner", "-loglevel", "error",
+        "-i", path,
+        "-vn", "-f", "s16le", "-acodec", "pcm_s16le",
+        "-ac", str(channels), "-ar", str(sample_rate),
+        "pipe:1",
+    ]
+    result = subprocess.run(command, capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed to decode {path}: {result.stderr.decode(errors='replace').strip()}")
+    return result.stdout
+
+
+def build_audio_timeline(audio_paths, output_path, sample_rate=44100, channels=1):
+    """
+    Decode the audio files one after another into a single WAV track.
+
+    Only one file is held in memory at a time. The durations are derived from
+    the decoded sample counts, so they match the track exactly.
+
+    :return: List with the duration in seconds of every input, in order
+    """
+    bytes_per_second = sample_rate * channels * 2
+    durations = []
+    with wave.open(output_path, "wb") as timeline:
+        timeline.setnchannels(channels)
+        timeline.setsampwidth(2)
+        timeline.setframerate(sample_rate)
+        for path in audio_paths:
+            pcm = decode_pcm(path, sample_rate, channels)
+            timeline.writeframes(pcm)
+            durations.append(len(pcm) / bytes_per_second)
+    return durations
+
+
+def decode_audio_16k_mono(path):
+    """
+    Decode an audio file to the 16 kHz mono float32 samples Whisper expects.
+
+    The samples are piped from ffmpeg into memory, no intermediate file is written.
+
+    :return: numpy array of samples in [-1, 1)
+    """
+    import numpy as np
+
+    pcm = decode_pcm(path, sample_rate=16000, channels=1)
+    return np.frombuffer(pcm, np.int16).astype(np.float32) / 32768.0
+
+
+def split_on_silence(samples, sample_rate=16000, max_chunk_seconds=120, min_chunk_seconds=60,
+                     frame_seconds=0.05):
+    """
+    Split audio into chunks of bounded length, cutting at the quietest moment.
+
+    Every cut is placed in the frame with the lowest RMS energy between
+    `min_chunk_seconds` and `max_chunk_seconds` after the previous cut, so words
+    are not split in half.
+
+    :param samples: Mono samples (numpy array)
+    :return: List of (start, end) sample indices covering the whole input
+    """
+    import numpy as np
+
+    frame = max(1, int(frame_seconds * sample_rate))
+    max_len = int(max_chunk_seconds * sample_rate)
+    min_len = int(min_chunk_seconds * sample_rate)
+    total = len(samples)
+
+    chunks = []
+    start = 0
+    while total - start > max_len:
+        window = samples[start + min_len:start + max_len]
+        frames = window[:len(window) // frame * frame].reshape(-1, frame)
+        rms = np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1))
+        # Cut in the middle of the quietest frame
+        cut = start + min_len + int(np.argmin(rms)) * frame + frame // 2
+        chunks.append((start, cut))
+        start = cut
+    chunks.append((start, total))
+    return chunks
+
+
+def stream_pcm(source, sample_rate=16000, channels=1, headers=None, chunk_bytes=64 * 1024):
+    """
+    Decode a local file or remote URL with ffmpeg and yield raw 16-bit PCM as it arrives.
+
+    A reader thread drains ffmpeg's output into a queue, so a slow consumer (e.g. a
+    Whisper call on the previous window) never fills the pipe and stalls the download.
+    The queue is unbounded; 16 kHz mono PCM grows by about 115 MB per hour of audio.
+    Remote sources reconnect after dropped connections instead of ending early.
+
+    :param headers: HTTP headers for remote sources, e.g. those yt-dlp requires (dict)
+    :param chunk_bytes: Size of the blocks read from ffmpeg (int)
+    """
+    command = [ffmpeg_executable(), "-hide_banner", "-loglevel", "error"]
+    if "://" in source:
+        command += ["-reconnect", "1", "-reconnect_streamed", "1", "-reconnect_delay_max", "30"]
+    if headers:
+        command += ["-headers", "".join(f"{name}: {value}\r\n" for name, value in headers.items())]
+    command += [
+        "-i", source,
+        "-vn", "-f", "s16le", "-acodec", "pcm_s16le",
+        "-ac", str(channels), "-ar", str(sample_rate),
+        "pipe:1",
+    ]
+    # stderr goes to a file, a pipe that is only read at the end could fill and block ffmpeg
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr)
+        blocks = queue.Queue()
+
+        def drain():
+            try:
+                while True:
+                    block = process.stdout.read(chunk_bytes)
+                    if not block:
+                        break
+                    blocks.put(block)
+            finally:
+                blocks.put(None)
+
+        reader = threading.Thread(target=drain, name="ffmpeg-reader", daemon=True)
+        reader.start()
+        try:
+            while True:
+                block = blocks.get()
+                if block is None:
+                    break
+                yield block
+            if process.wait() != 0:
+                stderr.seek(0)
+                raise RuntimeError(
+                    f"ffmpeg failed to decode {source}: {stderr.read().decode(errors='replace').strip()}"
+                )
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            reader.join()
+            process.stdout.close()
@@ -0,0 +1,164 @@
+import threading
+import time
+
+from instrumentation import peak_rss
+
+
+class ModelRegistry:
+    def __init__(self):
+        """
+        Process-wide store of loaded models.
+
+        Every model is loaded at most once per process and the same instance is
+        handed to every caller, so building a new Engine per request no longer
+        pays the model load again.
+        """
+        self._models = {}
+        self._load_times = {}
+        self._lock = threading.RLock()
+
+    def get(self, key, loader):
+        """
+        Return the model stored under `key`, loading it with `loader()` on first use.
+
+        :param key: Unique name of the model (str)
+        :param loader: Zero-argument callable that loads the model
+        :return: The loaded model instance
+        """
+        with self._lock:
+            if key not in self._models:
+                print(f"Loading model '{key}'...")
+                start = time.perf_counter()
+                self._models[key] = loader()
+                self._load_times[key] = time.perf_counter() - start
+                print(f"Model '{key}' loaded in {self._load_times[key]:.1f}s")
+            return self._models[key]
+
+    def get_llamarizer(self, use_cuda=False, inference_only=True, quantize_cpu=False):
+        """
+        Return the shared LLaMarizer for the given device and mode.
+
+        :param use_cuda: Run the model on GPU if True (bool)
+        :param inference_only: Skip the LoRA training wrapper (bool)
+        :param quantize_cpu: Apply dynamic int8 quantization on CPU (bool)
+        """
+        def load():
+            from llamarizer import LLaMarizer
+            return LLaMarizer(
+                use_cuda=use_cuda,
+                inference_only=inference_only,
+                quantize_cpu=quantize_cpu,
+            )
+
+        key = f"llamarizer:{'cuda' if use_cuda else 'cpu'}"
+        if inference_only:
+            key += ":inference"
+        if quantize_cpu and not use_cuda:
+            key += ":int8"
+        return self.get(key, load)
+
+    def get_whisper(self, model_name="base"):
+        """
+        Return the shared Whisper model of the given size.
+
+        :param model_name: Whisper model size, e.g. 'base' or 'small' (str)
+        """
+        def load():
+            import whisper
+            return whisper.load_model(model_name)
+
+        return self.get(f"whisper:{model_name}", load)
+
+    def load(self, key, loader):
+        """Eagerly load a model, e.g. to warm up a worker before the first request."""
+        return self.get(key, loader)
+
+    def unload(self, key):
+        """
+        Drop a model from the registry so its memory can be reclaimed.
+
+        :return: True if the model was loaded, False otherwise
+        """
+        with self._lock:
+            model = self._models.pop(key, None)
+            self._load_times.pop(key, None)
+
+        if model is None:
+            return False
+
+        # Worker pools, e.g. the Whisper pool, hold their models in child processes
+        if hasattr(model, "shutdown"):
+            model.shutdown(wait=True)
+        del model
+        _release_memory()
+        return True
+
+    def unload_all(self):
+        """Drop every loaded model."""
+        with self._lock:
+            keys = list(self._models)
+        for key in keys:
+            self.unload(key)
+
+    def loaded_models(self):
+        """Return the keys of all currently loaded models."""
+        with self._lock:
+            return list(self._models)
+
+    def memory_stats(self):
+        """
+        Report memory usage of the loaded models and of the process.
+
+        :return: Dict with per-model parameter bytes and load times, plus the
+                 process peak RSS and, if available, CUDA memory in bytes
+        """
+        with self._lock:
+            models = {
+                key: {
+                    "parameter_bytes": _parameter_bytes(model),
+                    "load_seconds": round(self._load_times.get(key, 0.0), 3),
+                }
+                for key, model in self._models.items()
+            }
+
+        stats = {
+            "models": models,
+            "process_peak_rss_bytes": peak_rss(),
+        }
+
+        try:
+            import torch
+            if torch.cuda.is_available():
+                stats["cuda_allocated_bytes"] = torch.cuda.memory_allocated()
+                stats["cuda_reserved_bytes"] = torch.cuda.memory_reserved()
+        except ImportError:
+            pass
+
+        return stats
+
+
+def _parameter_bytes(model):
+    """Sum the size of all parameters and buffers of a torch module, if it is one."""
+    module = getattr(model, "model", model)
+    if not hasattr(module, "parameters"):
+        return None
+    total = sum(p.numel() * p.element_size() for p in module.parameters())
+    if hasattr(module, "buffers"):
+        total += sum(b.numel() * b.element_size() for b in module.buffers())
+    return total
+
+
+def _release_memory():
+    """Run the garbage collector and return cached CUDA memory to the driver."""
+    import gc
+    gc.collect()
+    try:
+        import torch
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+    except ImportError:
+        pass
+
+
+# Shared registry for the whole process
+registry = ModelRegistry()
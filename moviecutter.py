@@ -1,11 +1,93 @@
 #pip install moviepy==1.0.3
 #pip install --upgrade imageio decorator
 #pip install moviepy==2.0.0
+import json
 import os
-from moviepy.editor import ImageSequenceClip, ImageClip, AudioFileClip, concatenate_videoclips
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from artifactcache import ArtifactCache, hash_file
+from mediautils import build_audio_timeline, run_ffmpeg
+
+# Output settings per render quality. A draft is a fraction of the resolution at a
+# low frame rate with the fastest encoder preset, meant for checking pacing and images.
+RENDER_PROFILES = {
+    "full": {"scale": 1.0, "fps": 24, "preset": "veryfast", "crf": 23},
+    "draft": {"scale": 1 / 3, "fps": 8, "preset": "ultrafast", "crf": 32},
+}
+
+AUDIO_ENCODE_ARGS = ["-c:a", "aac", "-b:a", "128k", "-ar", "44100", "-ac", "2"]
+
+
+def video_encode_args(preset="veryfast", crf=23):
+    """
+    Encoder settings shared by the ffmpeg renderers. Segments must all use the same
+    parameters so they can be joined without re-encoding.
+    """
+    return ["-c:v", "libx264", "-preset", preset, "-tune", "stillimage", "-crf", str(crf),
+            "-pix_fmt", "yuv420p"]
+
+
+def _scale_filter(width, height):
+    """Letterbox any image to exactly width x height."""
+    return (
+        f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+        f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1"
+    )
+
+
+def render_segment(image_path, audio_path, output_path, size, fps, encode_args, duration):
+    """
+    Encode one still image with its audio into a standalone segment file of exactly
+    `duration` seconds, a whole number of frames. The audio is padded with silence
+    or trimmed to that length, so audio and video of every segment end together.
+    Runs in a worker process of the 'segments' renderer.
+    """
+    width, height = size
+    tmp_path = output_path + ".part.mp4"
+    run_ffmpeg([
+        "-loop", "1", "-framerate", str(fps), "-i", image_path,
+        "-i", audio_path,
+        "-t", f"{duration:.6f}",
+        "-vf", _scale_filter(width, height),
+        "-af", "apad",
+        "-r", str(fps),
+        *encode_args,
+        *AUDIO_ENCODE_ARGS,
+        tmp_path,
+    ])
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+
+def _relative_to(path, base_dir):
+    """`path` relative to `base_dir`, or absolute if it is on another drive (Windows)."""
+    try:
+        return os.path.relpath(os.path.abspath(path), base_dir)
+    except ValueError:
+        return os.path.abspath(path)
 
 class MovieCutter:
-    def __init__(self, script_sentences, audio_paths, image_paths):
+    def __init__(self, script_sentences, audio_paths, image_paths, renderer="moviepy", size=(1080, 1920),
+                 workers=None, segments_dir="render_segments", cache=None, segments_max_bytes=2 * 1024 ** 3):
+        """
+        :param renderer: 'moviepy' composes the clips frame by frame in Python, 'ffmpeg'
+                         renders all still images and audio in a single native ffmpeg pass,
+                         'segments' encodes every sentence separately in a process pool and
+                         joins the segments without re-encoding
+        :param size: Output (width, height) of the ffmpeg renderers; images are letterboxed to it
+        :param workers: Number of processes of the 'segments' renderer, defaults to the CPU count
+        :param segments_dir: Directory of the segment cache if no `cache` is given; segments
+                             whose inputs did not change are reused from earlier renders
+        :param cache: ArtifactCache to keep encoded segments in, sharing its size limit and LRU
+                      eviction with the other stages (ArtifactCache)
+        :param segments_max_bytes: Size limit of the segment cache if no `cache` is given (int)
+        """
+        if renderer not in ("moviepy", "ffmpeg", "segments"):
+            raise ValueError(f"Unknown renderer: {renderer}")
+
         if not (len(script_sentences) == len(audio_paths) == len(image_paths)):
             raise ValueError("Number of sentences, audio files, and images must match")
         
@@ -20,46 +102,318 @@ class MovieCutter:
             
         self.pairs = list(zip(script_sentences, audio_paths, image_paths))
         self.clips = []
+        self.renderer = renderer
+        self.size = size
+        self.workers = workers
+        self.segments_dir = segments_dir
+        self.cache = cache
+        self.segments_max_bytes = segments_max_bytes
+
+        # Single audio track of all voiceovers, built on first use
+        self._work_dir = None
+        self.timeline_path = None
+        self.durations = None
+        self.audio_track = None
+        self.final_video = None
+
+    @classmethod
+    def from_manifest(cls, manifest_path, **kwargs):
+        """
+        Recreate a MovieCutter from a manifest written by `write_manifest`, e.g. to
+        promote a draft to a full-quality render from exactly the same inputs.
+        """
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        # Input paths are relative to the manifest, so any working directory can read it
+        base_dir = os.path.dirname(os.path.abspath(manifest_path))
+        audio_paths, image_paths = (
+            [os.path.join(base_dir, path) for path in manifest[key]] for key in ("audio_paths", "image_paths")
+        )
+        options = {"renderer": manifest["renderer"], "size": tuple(manifest["size"]), **kwargs}
+        return cls(manifest["sentences"], audio_paths, image_paths, **options)
+
+    def write_manifest(self, manifest_path, inputs_dir=None):
+        """
+        Save the render inputs and settings as JSON. Input paths are stored relative
+        to the manifest, so it can be read from any working directory.
+
+        :param inputs_dir: If given, the audio and image files are copied into this
+                           directory and the manifest points to the copies, so it stays
+                           valid when the originals are evicted from a cache (str)
+        """
+        audio_paths = [audio for _, audio, _ in self.pairs]
+        image_paths = [image for _, _, image in self.pairs]
+        if inputs_dir is not None:
+            os.makedirs(inputs_dir, exist_ok=True)
+            audio_paths, image_paths = (
+                [
+                    shutil.copyfile(path, os.path.join(inputs_dir, f"{kind}_{i}{os.path.splitext(path)[1]}"))
+                    for i, path in enumerate(paths)
+                ]
+                for kind, paths in (("audio", audio_paths), ("image", image_paths))
+            )
+
+        base_dir = os.path.dirname(os.path.abspath(manifest_path))
+        manifest = {
+            "sentences": [sentence for sentence, _, _ in self.pairs],
+            "audio_paths": [_relative_to(path, base_dir) for path in audio_paths],
+            "image_paths": [_relative_to(path, base_dir) for path in image_paths],
+            "renderer": self.renderer,
+            "size": list(self.size),
+        }
+        with open(manifest_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        return manifest_path
+
+    def output_settings(self, quality="full"):
+        """
+        Return the (width, height), fps and encoder arguments of a render quality.
+        """
+        if quality not in RENDER_PROFILES:
+            raise ValueError(f"Unknown render quality: {quality}")
+        profile = RENDER_PROFILES[quality]
+        # libx264 with yuv420p needs even dimensions
+        width, height = (max(2, int(round(side * profile["scale"] / 2)) * 2) for side in self.size)
+        return (width, height), profile["fps"], video_encode_args(profile["preset"], profile["crf"])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Close all clips and audio readers and remove the temporary audio track."""
+        for clip in [self.final_video, self.audio_track, *self.clips]:
+            if clip is not None:
+                try:
+                    clip.close()
+                except Exception:
+                    pass
+        self.final_video = None
+        self.audio_track = None
+        self.clips = []
+
+        if self._work_dir is not None:
+            shutil.rmtree(self._work_dir, ignore_errors=True)
+            self._work_dir = None
+            self.timeline_path = None
+            self.durations = None
+
+    def build_timeline(self):
+        """
+        Decode and concatenate all voiceovers into one WAV track.
+
+        :return: Tuple of the track path and the duration of every sentence in seconds
+        """
+        if self.timeline_path is None:
+            self._work_dir = tempfile.mkdtemp(prefix="moviecutter_")
+            timeline_path = os.path.join(self._work_dir, "voiceover_timeline.wav")
+            self.durations = build_audio_timeline([audio for _, audio, _ in self.pairs], timeline_path)
+            self.timeline_path = timeline_path
+        return self.timeline_path, self.durations
+
+    def frame_durations(self, fps):
+        """
+        Image durations snapped to whole frames along the timeline, so rounding
+        never accumulates into audio/video drift over many sentences.
+        """
+        _, durations = self.build_timeline()
+        snapped = []
+        start = 0.0
+        elapsed = 0.0
+        for duration in durations:
+            elapsed += duration
+            end = round(elapsed * fps) / fps
+            snapped.append(max(end - start, 1 / fps))
+            start = end
+        return snapped
+
+    def create_clip(self, image_path, duration):
+        """Create a silent video clip showing an image for `duration` seconds."""
+        # moviepy is only needed by the 'moviepy' renderer, so it is imported on first use
+        from moviepy.editor import ImageClip
 
-    def create_clip(self, image_path, audio_path):
-        """Create a video clip from an image and audio file."""
         try:
-            audio_clip = AudioFileClip(audio_path)
-            clip = ImageClip(image_path).set_duration(audio_clip.duration)
-            return clip.set_audio(audio_clip)
+            return ImageClip(image_path).set_duration(duration)
         except Exception as e:
-            raise RuntimeError(f"Failed to create clip from {image_path} and {audio_path}: {str(e)}")
+            raise RuntimeError(f"Failed to create clip from {image_path}: {str(e)}")
 
-    def generate_clips(self):
+    def generate_clips(self, fps=24):
         """Generate video clips for each sentence-audio-image pair."""
         self.clips = []  # Reset clips list
-        for sentence, audio_path, image_path in self.pairs:
+        for (sentence, audio_path, image_path), duration in zip(self.pairs, self.frame_durations(fps)):
             try:
-                clip = self.create_clip(image_path, audio_path)
+                clip = self.create_clip(image_path, duration)
                 self.clips.append(clip)
             except Exception as e:
                 raise RuntimeError(f"Failed to generate clip: {str(e)}")
         return self
 
     def concatenate_clips(self):
-        """Combine all clips into a single video."""
+        """Combine all clips into a single video with the voiceover timeline as its audio."""
+        from moviepy.editor import AudioFileClip, concatenate_videoclips
+
         if not self.clips:
             raise ValueError("No clips to concatenate. Call generate_clips() first.")
-        return concatenate_videoclips(self.clips, method="compose")
+        # Clips of one size (e.g. normalized frames) can be chained without per-frame compositing
+        method = "chain" if len({tuple(clip.size) for clip in self.clips}) == 1 else "compose"
+        video = concatenate_videoclips(self.clips, method=method)
+
+        # One reader for the whole track instead of one per sentence
+        timeline_path, _ = self.build_timeline()
+        if self.audio_track is not None:
+            self.audio_track.close()
+        self.audio_track = AudioFileClip(timeline_path)
+        return video.set_audio(self.audio_track)
+
+    def build_ffmpeg_command(self, output_filename, fps=24, size=None, encode_args=None):
+        """
+        Build the ffmpeg arguments rendering the whole reel in one pass.
+
+        Every image is looped for the duration of its sentence on the voiceover
+        timeline, scaled and padded to `size`, and the images are joined by a
+        single concat filter on top of the one audio track.
+        """
+        width, height = size or self.size
+        encode_args = encode_args or video_encode_args()
+        inputs = []
+        filters = []
+        segments = []
+        count = len(self.pairs)
+        timeline_path, _ = self.build_timeline()
+
+        for (_, _, image_path), duration in zip(self.pairs, self.frame_durations(fps)):
+            inputs += ["-loop", "1", "-framerate", str(fps), "-t", f"{duration:.6f}", "-i", image_path]
+
+        for i in range(count):
+            filters.append(f"[{i}:v]{_scale_filter(width, height)},format=yuv420p[v{i}]")
+            segments.append(f"[v{i}]")
+
+        filters.append(f"{''.join(segments)}concat=n={count}:v=1:a=0[v]")
+        inputs += ["-i", timeline_path]
+
+        return inputs + [
+            "-filter_complex", ";".join(filters),
+            "-map", "[v]", "-map", f"{count}:a",
+            "-r", str(fps),
+            *encode_args,
+            *AUDIO_ENCODE_ARGS,
+            "-movflags", "+faststart",
+            output_filename,
+        ]
+
+    def render_segments(self, fps=24, size=None, encode_args=None):
+        """
+        Encode every image/audio pair into its own segment file, in parallel.
+
+        Segments are cached under a hash of their inputs and encoder settings,
+        so segments that already exist from an earlier render are reused.
+
+        :return: List of segment paths in script order
+        """
+        # The cache is only opened by this renderer, so other renderers leave no directory behind
+        cache = self.cache or ArtifactCache(self.segments_dir, self.segments_max_bytes)
+        size = tuple(size or self.size)
+        encode_args = encode_args or video_encode_args()
+
+        keys = []
+        jobs = {}
+        # Same frame-snapped durations as the other renderers, taken from the decoded timeline
+        for (_, audio_path, image_path), duration in zip(self.pairs, self.frame_durations(fps)):
+            key = ArtifactCache.make_key(
+                "segment",
+                image=hash_file(image_path),
+                audio=hash_file(audio_path),
+                duration=round(duration, 6),
+                size=list(size),
+                fps=fps,
+                video=encode_args,
+                audio_codec=AUDIO_ENCODE_ARGS,
+            )
+            keys.append(key)
+            if key not in jobs and cache.get_file("segment", key) is None:
+                jobs[key] = (image_path, audio_path, duration)
+
+        print(f"Rendering {len(jobs)} of {len(keys)} segments, reusing the rest")
+        if jobs:
+            with tempfile.TemporaryDirectory() as tmp_dir, ProcessPoolExecutor(max_workers=self.workers) as executor:
+                futures = {
+                    key: executor.submit(
+                        render_segment, image_path, audio_path, os.path.join(tmp_dir, f"{key}.mp4"),
+                        size, fps, encode_args, duration,
+                    )
+                    for key, (image_path, audio_path, duration) in jobs.items()
+                }
+                for key, future in futures.items():
+                    cache.put_file("segment", key, future.result())
+
+        segment_paths = [cache.get_file("segment", key) for key in keys]
+        if None in segment_paths:
+            raise RuntimeError("Segments were evicted during the render; the segment cache is too small")
+        return segment_paths
+
+    def concatenate_segments(self, segment_paths, output_filename):
+        """
+        Join encoded segments with ffmpeg's concat demuxer, copying the streams without re-encoding.
+        """
+        list_path = output_filename + ".segments.txt"
+        with open(list_path, "w", encoding="utf-8") as f:
+            for segment_path in segment_paths:
+                escaped = os.path.abspath(segment_path).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+        try:
+            run_ffmpeg([
+                "-f", "concat", "-safe", "0", "-i", list_path,
+                "-c", "copy",
+                "-movflags", "+faststart",
+                output_filename,
+            ])
+        finally:
+            os.remove(list_path)
+        return output_filename
+
+    def create_video(self, output_filename="final_educational_reel.mp4", fps=None, quality="full"):
+        """
+        Create the final video file.
+        Use the MovieCutter as a context manager, or call close(), to release the
+        clips and the temporary audio track afterwards.
+
+        :param fps: Frame rate, defaults to the one of the render quality
+        :param quality: 'full', or 'draft' for a fast low-resolution preview
+        """
+        size, profile_fps, encode_args = self.output_settings(quality)
+        fps = fps or profile_fps
 
-    def create_video(self, output_filename="final_educational_reel.mp4", fps=24):
-        """Create the final video file."""
-        if not self.clips:
-            self.generate_clips()
-        
         # Validate output directory exists
         output_dir = os.path.dirname(output_filename)
         if output_dir and not os.path.exists(output_dir):
             os.makedirs(output_dir)
+
+        if self.renderer == "ffmpeg":
+            try:
+                run_ffmpeg(self.build_ffmpeg_command(output_filename, fps, size, encode_args))
+                return output_filename
+            except Exception as e:
+                raise RuntimeError(f"Failed to create video: {str(e)}")
+
+        if self.renderer == "segments":
+            try:
+                segment_paths = self.render_segments(fps, size, encode_args)
+                return self.concatenate_segments(segment_paths, output_filename)
+            except Exception as e:
+                raise RuntimeError(f"Failed to create video: {str(e)}")
+
+        if not self.clips:
+            self.generate_clips(fps)
             
         try:
-            final_video = self.concatenate_clips()
-            final_video.write_videofile(output_filename, fps=fps)
+            self.final_video = self.concatenate_clips()
+            write_options = {"fps": fps}
+            if quality != "full":
+                self.final_video = self.final_video.resize(newsize=size)
+                write_options["preset"] = RENDER_PROFILES[quality]["preset"]
+            self.final_video.write_videofile(output_filename, **write_options)
             return output_filename
         except Exception as e:
             raise RuntimeError(f"Failed to create video: {str(e)}")
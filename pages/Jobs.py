@@ -0,0 +1,52 @@
+import time
+
+import streamlit as st
+
+from jobqueue import JobQueue, QUEUED, RUNNING, DONE, FAILED
+
+# The worker service has to run alongside the app: python jobworker.py --workers 2
+queue = JobQueue()
+
+
+def main():
+    st.title("Reelwise jobs")
+
+    # Jobs are processed by the worker service, so the page never blocks on the pipeline
+    with st.form("submit_job", clear_on_submit=True):
+        video_url = st.text_input("Enter the YouTube video URL:")
+        draft = st.checkbox("Draft preview (low resolution, not published)")
+        if st.form_submit_button("Queue reel"):
+            if not video_url:
+                st.error("Please provide a valid YouTube URL.")
+            else:
+                job_id = queue.submit(video_url, draft=draft)
+                st.success(f"Job {job_id} queued.")
+
+    counts = queue.counts()
+    st.caption(
+        f"Queued: {counts.get(QUEUED, 0)} | Running: {counts.get(RUNNING, 0)} | "
+        f"Done: {counts.get(DONE, 0)} | Failed: {counts.get(FAILED, 0)}"
+    )
+
+    jobs = queue.list_jobs()
+    for job in jobs:
+        label = "draft" if job["options"].get("draft") else "full"
+        st.markdown(f"**Job {job['id']}** ({label}) · {job['video_url']}")
+        if job["status"] == RUNNING:
+            st.progress(job["progress"], text=job["stage"] or "starting")
+        elif job["status"] == QUEUED:
+            st.info("Waiting for a worker")
+        elif job["status"] == DONE:
+            st.success(f"Done in {job['finished'] - job['started']:.0f}s: {job['result_path']}")
+            if job["options"].get("draft") and job["result_path"]:
+                st.video(job["result_path"])
+        else:
+            st.error(f"Failed: {job['error']}")
+
+    # Poll while jobs are pending
+    if any(job["status"] in (QUEUED, RUNNING) for job in jobs):
+        time.sleep(3)
+        st.rerun()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_EXCEPTION, wait
+
+
+class StageScheduler:
+    def __init__(self, concurrency=None, max_workers=8):
+        """
+        Runs pipeline stages as a dependency graph on a thread pool.
+
+        :param concurrency: Maximum number of items running at once per stage,
+                            e.g. {"images": 4} (dict). Stages not listed run one item at a time.
+        :param max_workers: Number of threads available for per-item work (int)
+        """
+        self.concurrency = dict(concurrency or {})
+        self._limits = {}
+        self._limits_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="stage-item")
+
+    def limit(self, stage):
+        """
+        Return the semaphore bounding how many items of `stage` run at once.
+        """
+        with self._limits_lock:
+            if stage not in self._limits:
+                self._limits[stage] = threading.BoundedSemaphore(max(1, self.concurrency.get(stage, 1)))
+            return self._limits[stage]
+
+    def submit(self, stage, func, *args, **kwargs):
+        """
+        Run one item of `stage` in the background, respecting the stage's concurrency limit.
+
+        :return: Future holding the result of `func(*args, **kwargs)`
+        """
+        def run():
+            with self.limit(stage):
+                return func(*args, **kwargs)
+
+        return self._executor.submit(run)
+
+    def run(self, stages):
+        """
+        Run a graph of stages, starting each one as soon as its dependencies are done.
+
+        :param stages: Dict mapping a stage name to `(func, dependencies)`. `func` is
+                       called with the results of its dependencies as keyword arguments.
+        :return: Dict mapping each stage name to its result
+        :raises: The first exception raised by any stage
+        """
+        for name, (_, deps) in stages.items():
+            for dep in deps:
+                if dep not in stages:
+                    raise ValueError(f"Stage '{name}' depends on unknown stage '{dep}'")
+
+        results = {}
+        running = {}
+        pending = dict(stages)
+
+        # Stages get their own threads so a stage waiting on its items never starves the item pool
+        with ThreadPoolExecutor(max_workers=max(1, len(stages)), thread_name_prefix="stage") as executor:
+            while pending or running:
+                for name, (func, deps) in list(pending.items()):
+                    if all(dep in results for dep in deps):
+                        kwargs = {dep: results[dep] for dep in deps}
+                        running[executor.submit(func, **kwargs)] = name
+                        del pending[name]
+
+                if not running:
+                    raise ValueError(f"Stage graph has a cycle: {sorted(pending)}")
+
+                done, _ = wait(list(running), return_when=FIRST_EXCEPTION)
+                for future in done:
+                    name = running.pop(future)
+                    # Re-raises the stage's exception, if any
+                    results[name] = future.result()
+
+        return results
+
+    def shutdown(self):
+        """Stop the item thread pool once all submitted items are finished."""
+        self._executor.shutdown(wait=True)
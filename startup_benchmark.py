@@ -0,0 +1,138 @@
+"""
+Startup-time benchmark: measures the import cost of every Reelwise module.
+
+Each module is imported in a fresh interpreter with `python -X importtime`, so the
+numbers reflect a cold start. The report lists the cumulative import time per
+module and any heavy library it pulls in at import time, which should be none
+for the modules on the UI path.
+
+Usage:
+    python startup_benchmark.py [--repeat 3] [--top 5] [--json startup_times.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+MODULES = [
+    "appworkflow",
+    "app",
+    "ytdownloader",
+    "llamarizer",
+    "imagescraper",
+    "imagecache",
+    "imagenormalizer",
+    "TextToSpeechTransformer",
+    "moviecutter",
+    "Cloud_Uploader",
+    "reelPublisher",
+    "modelregistry",
+    "artifactcache",
+    "stagescheduler",
+    "mediautils",
+]
+
+# Libraries that must only be imported once their stage runs
+HEAVY_LIBRARIES = [
+    "torch", "transformers", "peft", "whisper", "selenium", "moviepy",
+    "edge_tts", "cloudinary", "PIL", "numpy", "aiohttp", "yt_dlp",
+]
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def measure_import(module):
+    """
+    Import `module` in a fresh interpreter and parse the `-X importtime` report.
+
+    :return: Dict with the wall time, the module's cumulative import time, the
+             slowest imports and the heavy libraries it loaded
+    """
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_DIR,
+        capture_output=True,
+        text=True,
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+
+    imports = {}
+    for line in result.stderr.splitlines():
+        # Format: "import time:      self [us] |  cumulative | imported package"
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        name = parts[2].strip()
+        imports[name] = max(imports.get(name, 0), int(parts[1]) / 1000)
+
+    error = None
+    if result.returncode != 0:
+        error = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed"
+
+    return {
+        "module": module,
+        "wall_ms": round(wall_ms, 1),
+        "import_ms": round(imports.get(module, 0.0), 1),
+        "slowest": sorted(
+            ((name, round(ms, 1)) for name, ms in imports.items() if name != module and "." not in name),
+            key=lambda item: item[1],
+            reverse=True,
+        ),
+        "heavy": [lib for lib in HEAVY_LIBRARIES if lib in imports],
+        "error": error,
+    }
+
+
+def run_benchmark(modules, repeat=3, top=5):
+    """
+    Measure every module `repeat` times and keep the median.
+
+    :return: One result dict per module
+    """
+    results = []
+    for module in modules:
+        runs = [measure_import(module) for _ in range(repeat)]
+        result = runs[0]
+        result["wall_ms"] = round(statistics.median(run["wall_ms"] for run in runs), 1)
+        result["import_ms"] = round(statistics.median(run["import_ms"] for run in runs), 1)
+        result["slowest"] = result["slowest"][:top]
+        results.append(result)
+    return results
+
+
+def print_report(results):
+    print(f"{'module':<26}{'import ms':>11}{'wall ms':>10}  heavy libraries / slowest imports")
+    for result in results:
+        if result["error"]:
+            detail = f"ERROR: {result['error']}"
+        else:
+            slowest = ", ".join(f"{name} {ms}ms" for name, ms in result["slowest"])
+            heavy = ", ".join(result["heavy"]) or "none"
+            detail = f"heavy: {heavy} | {slowest}"
+        print(f"{result['module']:<26}{result['import_ms']:>11}{result['wall_ms']:>10}  {detail}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold import time of Reelwise modules.")
+    parser.add_argument("modules", nargs="*", default=MODULES, help="Modules to measure (default: all)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per module, the median is reported")
+    parser.add_argument("--top", type=int, default=5, help="Number of slowest imports listed per module")
+    parser.add_argument("--json", help="Append the results as one JSON line to this file")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.modules, args.repeat, args.top)
+    print_report(results)
+
+    if args.json:
+        with open(args.json, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"timestamp": time.time(), "python": sys.version.split()[0], "results": results}) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from imagescraper import ImageScraper, parse_bing_image_urls
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+# Bytes served for every image path the fixture pages point to
+IMAGES = {
+    "/img/mitochondria.jpg": ("image/jpeg", b"\xff\xd8\xff\xe0mitochondria"),
+    "/img/organelles.png": ("image/png", b"\x89PNG\r\n\x1a\norganelles"),
+    "/img/leaf.jpg": ("image/jpeg", b"\xff\xd8\xff\xe0leaf"),
+    "/img/chloroplast.jpg": ("image/jpeg", b"\xff\xd8\xff\xe0chloroplast"),
+    "/img/not-an-image.html": ("text/html", b"<html>not an image</html>"),
+}
+
+
+def read_fixture(name, base_url):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read().replace("__BASE__", base_url)
+
+
+@pytest.fixture(scope="module")
+def bing_server():
+    """
+    Local stand-in for Bing Images: /images/search serves a recorded results page,
+    chosen by the query, and /img/... serves the images it links to.
+    """
+    requests_seen = []
+    search_ports = []
+
+    class Handler(BaseHTTPRequestHandler):
+        # Keep-alive, so connection reuse by the client is visible
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            requests_seen.append(self.path)
+            base_url = f"http://{self.headers['Host']}"
+
+            if url.path == "/images/search":
+                search_ports.append(self.client_address[1])
+                query = parse_qs(url.query).get("q", [""])[0]
+                if query == "server error":
+                    self._respond(500, "text/plain", b"internal error")
+                elif query == "photosynthesis":
+                    self._respond(200, "text/html", read_fixture("bing_results_thumbnails.html", base_url).encode())
+                else:
+                    self._respond(200, "text/html", read_fixture("bing_results.html", base_url).encode())
+            elif url.path in IMAGES:
+                self._respond(200, *IMAGES[url.path])
+            else:
+                self._respond(404, "text/plain", b"not found")
+
+        def _respond(self, status, content_type, body):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.base_url = f"http://127.0.0.1:{server.server_port}"
+    server.requests_seen = requests_seen
+    server.search_ports = search_ports
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def scraper(bing_server, tmp_path):
+    with ImageScraper(
+        save_folder=str(tmp_path),
+        backend="http",
+        search_url=f"{bing_server.base_url}/images/search",
+        request_timeout=5,
+        num_candidates=3,
+    ) as scraper:
+        yield scraper
+
+
+def test_parse_metadata_urls_in_result_order():
+    page = read_fixture("bing_results.html", "http://local")
+    assert parse_bing_image_urls(page, num_images=2) == [
+        "http://local/img/not-an-image.html",
+        "http://local/img/mitochondria.jpg",
+    ]
+
+
+def test_parse_falls_back_to_mimg_thumbnails():
+    page = read_fixture("bing_results_thumbnails.html", "http://local")
+    assert parse_bing_image_urls(page) == [
+        "http://local/img/leaf.jpg",
+        "http://local/img/chloroplast.jpg?w=275&h=183",
+    ]
+
+
+def test_search_images_http_against_fixture_server(scraper, bing_server):
+    results = scraper.search_images_http(["mitochondria diagram", "photosynthesis", "server error"], num_images=3)
+
+    assert results == [
+        [
+            f"{bing_server.base_url}/img/not-an-image.html",
+            f"{bing_server.base_url}/img/mitochondria.jpg",
+            f"{bing_server.base_url}/img/organelles.png",
+        ],
+        [
+            f"{bing_server.base_url}/img/leaf.jpg",
+            f"{bing_server.base_url}/img/chloroplast.jpg?w=275&h=183",
+        ],
+        [],
+    ]
+
+
+def test_searches_reuse_one_connection(scraper, bing_server):
+    del bing_server.search_ports[:]
+    for query in ["mitochondria diagram", "photosynthesis", "mitochondria diagram"]:
+        assert scraper.search_images_http([query], num_images=1)
+
+    # Every call goes through the scraper's long-lived session
+    assert len(bing_server.search_ports) == 3
+    assert len(set(bing_server.search_ports)) == 1
+
+
+def test_failed_query_returns_empty_list(scraper):
+    assert scraper.scrape_bing_images("server error") == []
+
+
+def test_download_images_for_bing_prompts_end_to_end(scraper, tmp_path):
+    paths = scraper.download_images_for_bing_prompts(
+        ["mitochondria diagram", "server error", "photosynthesis"], prefix="reel_"
+    )
+
+    # The failed query yields no image; the others keep their order
+    assert [os.path.basename(path) for path in paths] == ["reel_prompt_0_image_0.jpg", "reel_prompt_2_image_0.jpg"]
+    # The first candidate is not an image, so the second one is downloaded
+    with open(paths[0], "rb") as f:
+        assert f.read() == IMAGES["/img/mitochondria.jpg"][1]
+    with open(paths[1], "rb") as f:
+        assert f.read() == IMAGES["/img/leaf.jpg"][1]
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".part")]
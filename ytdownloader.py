@@ -1,80 +1,122 @@
-import sys
-import subprocess
+#pip install yt-dlp openai-whisper streamlit
+
 import os
-import whisper
+import re
+import html
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from modelregistry import registry
+from mediautils import decode_audio_16k_mono, split_on_silence, stream_pcm
 
-# Install required packages
-def install_package(package_name):
-    """Helper function to install a Python package using pip."""
-    try:
-        subprocess.check_call([sys.executable, "-m", "pip", "install", package_name])
-        print(f"'{package_name}' has been successfully installed.")
-    except subprocess.CalledProcessError as e:
-        print(f"Error occurred while installing '{package_name}': {e}")
-    except Exception as e:
-        print(f"Unexpected error: {e}")
+WHISPER_SAMPLE_RATE = 16000
 
-# Install required packages
-install_package("yt-dlp")
-install_package("openai-whisper") 
-install_package("streamlit")
+# Audio-only formats, smallest first; speech needs no high bitrate
+AUDIO_FORMAT_OPTIONS = {
+    "format": "bestaudio[vcodec=none]/bestaudio/best",
+    "format_sort": ["+size", "+br"],
+    "noplaylist": True,
+}
+
+def extract_video_id(video_url):
+    """
+    Extracts the YouTube video ID from a URL.
+    
+    Parameters:
+    - video_url (str): The URL of the YouTube video.
+    
+    Returns:
+    - str: The video ID, or a hash of the URL if no ID can be found.
+    """
+    match = re.search(r"(?:v=|youtu\.be/|shorts/|embed/|live/)([A-Za-z0-9_-]{11})", video_url)
+    if match:
+        return match.group(1)
+    return hashlib.sha256(video_url.strip().encode("utf-8")).hexdigest()
 
 def download_youtube_audio(video_url, output_path="downloads"):
     """
-    Downloads a YouTube audio as mp3 file using yt-dlp.
+    Downloads the smallest audio-only stream of a YouTube video using the yt-dlp API.
+    The stream is saved as delivered (usually m4a or webm), without re-encoding,
+    since it is decoded to 16 kHz PCM for Whisper anyway.
     
     Parameters:
     - video_url (str): The URL of the YouTube video.
     - output_path (str): The directory where the audio will be saved.
     
     Returns:
-    - String: Path to the downloaded audio file.
+    - String: Path to the downloaded audio file, named after the video ID.
     """
+    import yt_dlp
+
     try:
         # Create output directory if it doesn't exist
-        if not os.path.exists(output_path):
-            os.makedirs(output_path)
-
-        # Download the audio file (MP3)
-        audio_output_template = os.path.join(output_path, "%(title)s.mp3")
-        audio_command = [
-            "yt-dlp",
-            video_url,
-            "-o", audio_output_template,
-            "--extract-audio",
-            "--audio-format", "mp3"
-        ]
-        print("Downloading audio...")
-        subprocess.run(audio_command, check=True)
-
-        # Locate the downloaded files
-        downloaded_file = os.listdir(output_path)
+        os.makedirs(output_path, exist_ok=True)
 
-        audio_file = next(
-            (os.path.join(output_path, f) for f in downloaded_file
-             if f.endswith(".mp3")),
-            None
-        )
+        options = {
+            **AUDIO_FORMAT_OPTIONS,
+            "outtmpl": os.path.join(output_path, "%(id)s.%(ext)s"),
+            "quiet": True,
+            "no_warnings": True,
+        }
+        print("Downloading audio...")
+        with yt_dlp.YoutubeDL(options) as ydl:
+            info = ydl.extract_info(video_url, download=True)
+            downloads = info.get("requested_downloads") or []
+            audio_file = downloads[0]["filepath"] if downloads else ydl.prepare_filename(info)
 
-        if not audio_file:
+        if not os.path.exists(audio_file):
             raise Exception("Failed to download audio file.")
 
-        print(f"Downloaded audio file: {audio_file}")
+        print(f"Downloaded audio of {info['id']} ({info.get('format_id')}): {audio_file}")
         return audio_file
 
-    except subprocess.CalledProcessError as e:
-        print(f"Error occurred during download: {e}")
-        raise
     except Exception as e:
-        print(f"Unexpected error: {e}")
+        print(f"Error occurred during download: {e}")
         raise
 
-def transcribe_audio(file_path):
+def _init_whisper_worker(model_name, threads):
+    """Loads the Whisper model once when a worker process of the transcription pool starts."""
+    import torch
+    torch.set_num_threads(threads)
+    registry.get_whisper(model_name)
+
+def _transcribe_chunk(samples, model_name):
+    """Transcribes one chunk of 16 kHz mono samples in a worker process."""
+    return registry.get_whisper(model_name).transcribe(samples)["text"].strip()
+
+def whisper_pool(model_name, workers):
+    """
+    Return the process-wide pool of `workers` Whisper processes for `model_name`.
+
+    The pool lives in the model registry, so it is started once and every later
+    call, also from other threads, reuses its warm workers.
+    """
+    def start():
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        # Spawned workers do not inherit the parent's torch state
+        return ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_whisper_worker,
+            initargs=(model_name, threads),
+        )
+
+    return registry.get(f"whisper_pool:{model_name}:{workers}", start)
+
+def transcribe_audio(file_path, model_name="base", workers=1, max_chunk_seconds=120):
     """
     Transcribes an audio file using OpenAI's Whisper model.
     
+    With more than one worker the audio is split at silences into chunks of at most
+    `max_chunk_seconds`, which are transcribed in parallel worker processes and
+    joined back together in order.
+    
     Parameters:
     - file_path (str): Path to the audio file.
+    - model_name (str): Whisper model size. Loaded once per process.
+    - workers (int): Number of worker processes, None for one per CPU core.
+      Every worker holds its own copy of the model; the pool is kept for later calls.
+    - max_chunk_seconds (int): Maximum chunk length in parallel mode.
     
     Returns:
     - str: The transcription text.
@@ -86,12 +128,24 @@ def transcribe_audio(file_path):
         if not os.path.exists(file_path):
             raise Exception(f"Audio file does not exist: {file_path}")
             
-        print("Loading Whisper model...")
-        model = whisper.load_model("base")
-        
-        print("Transcribing audio...")
-        result = model.transcribe(file_path)
-        transcription = result["text"]
+        # Decode straight to the 16 kHz mono samples Whisper works on
+        audio = decode_audio_16k_mono(file_path)
+
+        workers = workers or os.cpu_count() or 1
+        chunks = split_on_silence(audio, WHISPER_SAMPLE_RATE, max_chunk_seconds, max_chunk_seconds / 2)
+
+        if workers == 1 or len(chunks) == 1:
+            model = registry.get_whisper(model_name)
+            print("Transcribing audio...")
+            transcription = model.transcribe(audio)["text"]
+        else:
+            print(f"Transcribing audio in {len(chunks)} chunks on {workers} workers...")
+            texts = whisper_pool(model_name, workers).map(
+                _transcribe_chunk,
+                [audio[start:end] for start, end in chunks],
+                [model_name] * len(chunks),
+            )
+            transcription = " ".join(text for text in texts if text)
         
         print("Transcription completed.")
         return transcription
@@ -100,21 +154,208 @@ def transcribe_audio(file_path):
         print(f"Error during transcription: {e}")
         raise
 
+def get_audio_stream(video_url):
+    """
+    Resolves the direct URL of the smallest audio-only stream without downloading it.
+    
+    Parameters:
+    - video_url (str): The URL of the YouTube video.
+    
+    Returns:
+    - tuple: (stream_url, http_headers) to pass to ffmpeg.
+    """
+    import yt_dlp
+
+    with yt_dlp.YoutubeDL({**AUDIO_FORMAT_OPTIONS, "quiet": True, "no_warnings": True}) as ydl:
+        info = ydl.extract_info(video_url, download=False)
+    # The selected format is merged into the top level of the info dict
+    fmt = (info.get("requested_formats") or [info])[0]
+    return fmt["url"], fmt.get("http_headers") or info.get("http_headers") or {}
+
+def stream_transcript(video_url, model_name="base", max_window_seconds=30, min_window_seconds=20):
+    """
+    Transcribes a video while its audio is still being downloaded.
+    
+    ffmpeg decodes the remote audio stream to 16 kHz mono PCM; every time a window
+    of audio is buffered it is cut at its quietest moment and transcribed, so the
+    first segments are available long before the download is complete. ffmpeg's
+    output is drained on a separate thread, so the download continues while a
+    window is being transcribed.
+    
+    Parameters:
+    - video_url (str): The URL of the YouTube video.
+    - model_name (str): Whisper model size. Loaded once per process.
+    - max_window_seconds (int): Maximum length of a transcribed window.
+    - min_window_seconds (int): Minimum length of a window, except for the last one.
+    
+    Yields:
+    - str: The transcript segments, in order.
+    """
+    import numpy as np
+
+    model = registry.get_whisper(model_name)
+    stream_url, headers = get_audio_stream(video_url)
+    print("Streaming audio for transcription...")
+
+    window_bytes = max_window_seconds * WHISPER_SAMPLE_RATE * 2
+    buffer = bytearray()
+    previous = ""
+
+    def transcribe(samples):
+        # The end of the previous segment keeps spelling and style consistent across windows
+        return model.transcribe(samples, initial_prompt=previous[-200:] or None)["text"].strip()
+
+    for block in stream_pcm(stream_url, WHISPER_SAMPLE_RATE, 1, headers):
+        buffer.extend(block)
+        while len(buffer) > window_bytes:
+            samples = np.frombuffer(bytes(buffer), np.int16).astype(np.float32) / 32768.0
+            _, cut = split_on_silence(samples, WHISPER_SAMPLE_RATE, max_window_seconds, min_window_seconds)[0]
+            del buffer[:cut * 2]
+            text = transcribe(samples[:cut])
+            if text:
+                previous = text
+                yield text
+
+    if buffer:
+        text = transcribe(np.frombuffer(bytes(buffer), np.int16).astype(np.float32) / 32768.0)
+        if text:
+            yield text
+
+def vtt_to_text(vtt):
+    """
+    Converts WebVTT subtitles to plain text.
+    
+    Parameters:
+    - vtt (str): The content of a .vtt file.
+    
+    Returns:
+    - str: The spoken text without timestamps, markup, sound labels like [Music]
+      and the repeated lines of YouTube's rolling auto-captions.
+    """
+    lines = []
+    raw_lines = [line.strip() for line in vtt.splitlines()]
+    for i, line in enumerate(raw_lines):
+        if not line or "-->" in line or line.startswith(("WEBVTT", "Kind:", "Language:", "NOTE")):
+            continue
+        if i + 1 < len(raw_lines) and "-->" in raw_lines[i + 1]:
+            # Optional cue identifier, the line right before a cue's timing line;
+            # a caption that is only a number, e.g. "1984", is kept
+            continue
+        line = re.sub(r"<[^>]+>", "", line)
+        line = re.sub(r"\[[^\]]*\]", "", line)
+        line = html.unescape(" ".join(line.split()))
+        # Auto-captions repeat the previous line at the top of every cue
+        if line and (not lines or lines[-1] != line):
+            lines.append(line)
+    return " ".join(lines)
+
+def captions_usable(text, duration=None, min_words=50, min_words_per_minute=60):
+    """
+    Rough quality check for captions before they replace a Whisper transcript.
+    
+    Parameters:
+    - text (str): The caption text.
+    - duration (float): Length of the video in seconds, if known.
+    - min_words (int): Minimum number of words.
+    - min_words_per_minute (int): Minimum speech density; sparse captions
+      usually only cover part of the video.
+    
+    Returns:
+    - bool: True if the captions can be used as the transcript.
+    """
+    words = len(text.split())
+    if words < min_words:
+        return False
+    if duration:
+        return words / (duration / 60) >= min_words_per_minute
+    return True
+
+def _pick_subtitle_track(tracks, languages):
+    """Returns the URL of the first VTT track matching one of the languages, or None."""
+    for language in languages:
+        for code, formats in tracks.items():
+            if code == language or code.startswith(f"{language}-"):
+                for fmt in formats:
+                    if fmt.get("ext") == "vtt" and fmt.get("url"):
+                        return fmt["url"]
+    return None
+
+def fetch_youtube_captions(video_url, languages=("en",)):
+    """
+    Fetches existing YouTube subtitles, preferring manual over auto-generated ones.
+    
+    Parameters:
+    - video_url (str): The URL of the YouTube video.
+    - languages (tuple): Language codes in order of preference.
+    
+    Returns:
+    - tuple: (text, source) with source 'manual_captions' or 'auto_captions',
+      or (None, None) if there are no usable captions.
+    """
+    import yt_dlp
+
+    try:
+        with yt_dlp.YoutubeDL({"quiet": True, "no_warnings": True, "noplaylist": True}) as ydl:
+            info = ydl.extract_info(video_url, download=False)
+
+            for source, tracks in (("manual_captions", info.get("subtitles")),
+                                   ("auto_captions", info.get("automatic_captions"))):
+                url = _pick_subtitle_track(tracks or {}, languages)
+                if url is None:
+                    continue
+
+                text = vtt_to_text(ydl.urlopen(url).read().decode("utf-8", errors="replace"))
+                if captions_usable(text, info.get("duration")):
+                    print(f"Using {source.replace('_', ' ')} ({len(text.split())} words)")
+                    return text, source
+                print(f"Rejected {source.replace('_', ' ')}: too sparse for the video length")
+
+    except Exception as e:
+        print(f"Could not fetch captions: {e}")
+
+    return None, None
+
+def get_transcript(video_url, output_path="downloads", model_name="base", use_captions=True,
+                   languages=("en",), workers=1, stream=False):
+    """
+    Returns the transcript of a video, using existing captions when they are good
+    enough and Whisper otherwise.
+    
+    Parameters:
+    - video_url (str): The URL of the YouTube video.
+    - output_path (str): The directory for the audio, if it has to be downloaded.
+    - model_name (str): Whisper model size for the fallback.
+    - use_captions (bool): Whether to try the captions first.
+    - languages (tuple): Caption language codes in order of preference.
+    - workers (int): Number of Whisper worker processes, see transcribe_audio.
+    - stream (bool): Transcribe while downloading with stream_transcript instead.
+    
+    Returns:
+    - tuple: (text, source) with source 'manual_captions', 'auto_captions' or 'whisper'.
+    """
+    if use_captions:
+        text, source = fetch_youtube_captions(video_url, languages)
+        if text is not None:
+            return text, source
+
+    if stream:
+        return " ".join(stream_transcript(video_url, model_name)), "whisper"
+
+    audio_file = download_youtube_audio(video_url, output_path)
+    return transcribe_audio(audio_file, model_name, workers), "whisper"
+
 def process_youtube_link(video_url, output_path="downloads"):
     """
-    Orchestrates the download of audio and transcribes the audio.
+    Fetches the transcript of a video, from its captions or by transcribing its audio.
     Returns the path to the saved transcription file.
     """
-    # Download both video and audio
-    audio_file = download_youtube_audio(video_url, output_path)
-    
-    # Transcribe the audio
-    transcription = transcribe_audio(audio_file)
+    transcription, source = get_transcript(video_url, output_path)
     
-    # Save transcription to a text file (same name as audio file, plus suffix)
-    transcription_file = os.path.splitext(audio_file)[0] + "_transcription.txt"
+    # Save transcription to a text file named after the video, plus suffix
+    os.makedirs(output_path, exist_ok=True)
+    transcription_file = os.path.join(output_path, f"{extract_video_id(video_url)}_transcription.txt")
     with open(transcription_file, "w", encoding="utf-8") as f:
         f.write(transcription)
         
-    print(f"Transcription saved to: {transcription_file}")
+    print(f"Transcription ({source}) saved to: {transcription_file}")
     return transcription_file